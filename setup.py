@@ -7,7 +7,7 @@ setup(
     packages=find_packages(where="src"),
     entry_points={
         'console_scripts': [
-            'tkFV=tkFV.tkFV:main',
+            'tkFV=tkFV.cli:main',
         ],
     },
     install_requires=[],
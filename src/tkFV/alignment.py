@@ -0,0 +1,157 @@
+import re
+import os
+
+import numpy as np
+
+from .filelist import INT64_MAX, NO_KEY
+from .sources import frame_index, frame_path
+
+
+ALIGN_MODES = ["position", "inner", "outer", "nearest"]
+
+NUMBER_PATTERN = re.compile(r"\d+")
+
+
+def frame_key(entry, key_regex=None):
+    """Return the numeric key a pane entry is aligned on, or None if it has none
+
+    Frames of multi-frame files use their frame index. Files use the first
+    capture group of `key_regex` matched against the file name, or by default
+    the last number in it (the same digit runs extract_numbers sorts on).
+    """
+    index = frame_index(entry)
+    if index is not None:
+        return index
+
+    name = os.path.basename(frame_path(entry))
+    if key_regex is not None:
+        match = key_regex.search(name)
+        return int(match.group(1)) if match else None
+
+    numbers = NUMBER_PATTERN.findall(name)
+    return int(numbers[-1]) if numbers else None
+
+
+def pane_frame_keys(files, key_regex=None):
+    """Return the frame_key of every entry of a pane's files as an int64 array, NO_KEY for none
+
+    Keys are cached on the FileList per key regex, so a timeline rebuilt after
+    one pane changed only computes the keys of that pane. File lists from a
+    DirectoryIndex come with the default keys taken from their sort keys.
+    Keys beyond the int64 range are clamped, as in filelist.sort_key_array.
+    """
+    cache = getattr(files, "frame_keys", None)
+    pattern = key_regex.pattern if key_regex is not None else None
+    keys = cache.get(pattern) if cache is not None else None
+    if keys is None:
+        keys = np.array(
+            [
+                NO_KEY if key is None else min(max(key, NO_KEY + 1), INT64_MAX)
+                for key in (frame_key(entry, key_regex) for entry in files)
+            ],
+            dtype=np.int64,
+        )
+        if cache is not None:
+            cache[pattern] = keys
+    return keys
+
+
+class Timeline:
+    """Joined frame index across panes, mapping a timeline position to each pane's entry
+
+    "position" matches frames by list position, as tkFV always did. The other
+    modes match by the numeric key of each entry (see frame_key):
+
+    - "inner": only keys present in every pane with files
+    - "outer": every key of any pane, panes without that key show nothing
+    - "nearest": every key of any pane, panes show their entry with the closest key
+
+    The join is done once with vectorized sorts and searches, after which
+    entry() is an O(1) array lookup per pane.
+    """
+
+    def __init__(self, panes, mode="position", key_pattern=None):
+        if mode not in ALIGN_MODES:
+            raise ValueError(f"Unknown alignment mode '{mode}'")
+
+        self.mode = mode
+        self.files = {i: config.files for i, config in panes.items() if config.enabled}
+        self.keys = None  # Timeline keys, None in position mode
+        self.rows = {}  # Pane index -> array of file indices per timeline position (-1 = none)
+        self.keyless = []  # Panes with files of which none has a key, left out of the join
+
+        if mode == "position":
+            self.length = max((len(files) for files in self.files.values()), default=0)
+            return
+
+        try:
+            key_regex = re.compile(key_pattern) if key_pattern else None
+        except re.error as e:
+            raise ValueError(f"Invalid alignment key regex: {e}")
+        if key_regex is not None and key_regex.groups < 1:
+            raise ValueError("The alignment key regex needs a capture group")
+
+        # Per pane: unique sorted keys and the index of the first file with each key
+        pane_keys = {}
+        for i, files in self.files.items():
+            if not files:
+                continue
+            keys = pane_frame_keys(files, key_regex)
+            valid = np.flatnonzero(keys != NO_KEY)
+            values = keys[valid]
+            if len(values) == 0:
+                self.keyless.append(i)
+                continue
+            unique_keys, first = np.unique(values, return_index=True)
+            pane_keys[i] = (unique_keys, valid[first])
+
+        if not pane_keys:
+            self.keys = np.empty(0, dtype=np.int64)
+        elif mode == "inner":
+            self.keys = pane_keys[min(pane_keys)][0]
+            for unique_keys, _ in pane_keys.values():
+                self.keys = np.intersect1d(self.keys, unique_keys, assume_unique=True)
+        else:
+            self.keys = np.unique(np.concatenate([keys for keys, _ in pane_keys.values()]))
+
+        for i, (unique_keys, file_indices) in pane_keys.items():
+            self.rows[i] = self.join(unique_keys, file_indices, mode)
+
+        self.length = len(self.keys)
+
+    def join(self, unique_keys, file_indices, mode):
+        pos = np.searchsorted(unique_keys, self.keys)
+        clipped = np.minimum(pos, len(unique_keys) - 1)
+
+        if mode == "nearest":
+            # Pick whichever neighbour key is closer, preferring the lower one on ties
+            lower = np.maximum(pos - 1, 0)
+            use_lower = (pos == len(unique_keys)) | (
+                (pos > 0) & (self.keys - unique_keys[lower] <= unique_keys[clipped] - self.keys)
+            )
+            return file_indices[np.where(use_lower, lower, clipped)]
+
+        exact = unique_keys[clipped] == self.keys
+        return np.where(exact, file_indices[clipped], -1)
+
+    def __len__(self):
+        return self.length
+
+    def entry(self, pane_idx, position):
+        """Return the entry pane `pane_idx` shows at a timeline position, or None"""
+        files = self.files.get(pane_idx)
+        if not files or not 0 <= position < self.length:
+            return None
+
+        if self.keys is None:
+            return files[position] if position < len(files) else None
+
+        row = self.rows.get(pane_idx)
+        file_idx = row[position] if row is not None else -1
+        return files[file_idx] if file_idx >= 0 else None
+
+    def label(self, position):
+        """Return a short description of a timeline position for the frame label"""
+        if self.keys is None or not 0 <= position < self.length:
+            return ""
+        return f"key {self.keys[position]}"
@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from importlib import metadata
+
+import numpy as np
+from PIL import Image
+
+from .cache import DecodeCache
+from .compositor import COMPOSITOR_BACKENDS, make_compositor
+from .config import PaneConfig, parse_layout, resolve_pattern
+from .encoders import ENCODERS, make_encoder
+from .export import export_video
+from .fonts import FontRegistry
+from .index import DirectoryIndex
+
+
+DATASET_KINDS = {"png": ".png", "jpeg": ".jpg", "text": ".txt", "npy": ".npy"}
+DATASET_SEED = 1234  # Synthetic frames are identical for the same parameters on every run
+DATASET_MANIFEST = "dataset.json"
+TEXT_LINES = 200  # Lines per synthetic text frame
+COMPARE_TOLERANCE = 3.0  # Changes smaller than this many percent are reported as noise
+
+
+def parse_size(value):
+    width, height = map(int, value.lower().split("x"))
+    return width, height
+
+
+def synthetic_frame(rng, width, height, frame_idx):
+    """Return an RGB array with gradients, a moving bar and noise, so it compresses like a photo"""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frame = np.empty((height, width, 3), dtype=np.float32)
+    frame[..., 0] = x
+    frame[..., 1] = y
+    frame[..., 2] = (x + y + frame_idx * 8) % 256
+
+    bar = (frame_idx * 16) % width
+    frame[:, bar : bar + max(1, width // 20)] = 255
+    frame += rng.normal(0, 12, (height, width, 1))
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def generate_dataset(directory, kinds, frames, width, height):
+    """Write `frames` synthetic frames of each kind into <directory>/<kind>/
+
+    A manifest records the parameters; a directory generated with the same
+    parameters before is reused, since large frames are slow to encode.
+    """
+    manifest = {"kinds": sorted(kinds), "frames": frames, "size": [width, height]}
+    manifest_path = os.path.join(directory, DATASET_MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            if json.load(f) == manifest:
+                return False
+    except (OSError, ValueError):
+        pass
+
+    for kind in sorted(kinds):
+        # One generator per kind, so its frames do not depend on the other kinds requested
+        rng = np.random.default_rng([DATASET_SEED, list(DATASET_KINDS).index(kind)])
+        kind_dir = os.path.join(directory, kind)
+        shutil.rmtree(kind_dir, ignore_errors=True)
+        os.makedirs(kind_dir)
+
+        for frame_idx in range(frames):
+            path = os.path.join(kind_dir, f"frame_{frame_idx:05d}{DATASET_KINDS[kind]}")
+            if kind == "text":
+                with open(path, "w") as f:
+                    for line in range(TEXT_LINES):
+                        f.write(f"step {frame_idx} line {line} loss={rng.random():.6f}\n")
+                continue
+
+            frame = synthetic_frame(rng, width, height, frame_idx)
+            if kind == "npy":
+                np.save(path, frame)
+            else:
+                Image.fromarray(frame).save(path, quality=90)
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return True
+
+
+def build_panes(directory, kinds, layout):
+    """Fill every pane slot of the layout with a pattern, cycling through the dataset kinds"""
+    rows, cols = parse_layout(layout)
+    panes = {}
+    for i in range(rows * cols):
+        kind = kinds[i % len(kinds)]
+        config = PaneConfig(f"{kind}/frame_*{DATASET_KINDS[kind]}")
+        config.files = resolve_pattern(directory, config.pattern)
+        panes[i] = config
+    return panes
+
+
+def timing_stats(prefix, seconds):
+    """Return the mean/median/p95 milliseconds and throughput of a list of timings"""
+    ms = np.array(seconds) * 1000
+    return {
+        f"{prefix}_mean_ms": float(ms.mean()),
+        f"{prefix}_p50_ms": float(np.percentile(ms, 50)),
+        f"{prefix}_p95_ms": float(np.percentile(ms, 95)),
+        f"{prefix}_fps": float(len(ms) * 1000 / ms.sum()) if ms.sum() > 0 else 0.0,
+    }
+
+
+def bench_patterns(directory, panes, repeat):
+    """Time pattern resolution as the GUI does it: cold and warm directory index, and plain glob"""
+    results = {}
+    for pattern in sorted({config.pattern for config in panes.values()}):
+        kind = pattern.split("/")[0]
+        cold, warm, globbed = [], [], []
+        for _ in range(repeat):
+            index = DirectoryIndex(directory)
+            start = time.perf_counter()
+            index.match(pattern)
+            cold.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            index.match(pattern)
+            warm.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            resolve_pattern(directory, pattern)
+            globbed.append(time.perf_counter() - start)
+
+        results[f"pattern/{kind}/index_cold_ms"] = float(np.median(cold) * 1000)
+        results[f"pattern/{kind}/index_warm_ms"] = float(np.median(warm) * 1000)
+        results[f"pattern/{kind}/glob_ms"] = float(np.median(globbed) * 1000)
+    return results
+
+
+def new_compositor(backend, font):
+    decode_cache = DecodeCache(workers=1, arrays=backend == "opencv")
+    return make_compositor(backend, decode_cache, FontRegistry(font))
+
+
+def bench_compose(layout, panes, frames, width, height, font, backend):
+    """Time rendering every frame twice: from cold caches, then again with warm ones"""
+    compositor = new_compositor(backend, font)
+    results = {}
+    for prefix in ("compose/cold", "compose/warm"):
+        seconds = []
+        for frame_idx in range(frames):
+            start = time.perf_counter()
+            compositor.render(layout, panes, frame_idx, width, height)
+            seconds.append(time.perf_counter() - start)
+        results.update(timing_stats(prefix, seconds))
+    compositor.decode_cache.shutdown()
+    return results
+
+
+def bench_export(layout, panes, frames, width, height, font, workers, backend, encoder):
+    """Time a full video export from cold caches"""
+    compositor = new_compositor(backend, font)
+    output_dir = tempfile.mkdtemp(prefix="tkFV-bench-")
+    try:
+        output_path = os.path.join(output_dir, "export.mp4")
+        start = time.perf_counter()
+        export_video(
+            compositor, layout, panes, frames, width, height, 30, output_path, workers=workers,
+            encoder=make_encoder(output_path, encoder),
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        compositor.decode_cache.shutdown()
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return {"export/seconds": elapsed, "export/fps": frames / elapsed}
+
+
+def package_version():
+    try:
+        return metadata.version("tkFV")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def compare(results, baseline):
+    """Print the relative change of every metric against a previous results file"""
+    print(f"Compared to tkFV {baseline.get('tkFV', 'unknown')}:", file=sys.stderr)
+    for name, value in results["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        change = (value - old) / old * 100
+        # Times should go down and frame rates up
+        better = change > 0 if name.endswith("fps") else change < 0
+        if abs(change) < COMPARE_TOLERANCE:
+            verdict = "same"
+        else:
+            verdict = "better" if better else "worse"
+        print(f"  {name:<32} {old:10.2f} -> {value:10.2f} ({change:+.1f}%, {verdict})",
+              file=sys.stderr)
+
+
+def build_benchmark_parser():
+    parser = argparse.ArgumentParser(
+        prog="tkFV benchmark",
+        description="Measure pattern resolution, frame composition and export throughput on a "
+        "synthetic dataset and write the results as JSON.",
+    )
+    parser.add_argument("-o", "--output", help="Results JSON file (printed to stdout if omitted)")
+    parser.add_argument(
+        "--data", help="Dataset directory, reused across runs (defaults to a temporary directory)"
+    )
+    parser.add_argument(
+        "--kinds",
+        default="png,jpeg,text,npy",
+        help=f"Comma separated frame kinds, from {', '.join(DATASET_KINDS)}",
+    )
+    parser.add_argument("--frames", type=int, default=30, help="Frames per kind")
+    parser.add_argument(
+        "--frame-size", type=parse_size, default=(1920, 1080), help="Size of the synthetic frames"
+    )
+    parser.add_argument("--layout", default="3x3", help="Pane layout, filled cyclically by kind")
+    parser.add_argument(
+        "-s", "--size", type=parse_size, default=(1600, 1200), help="Rendered canvas size"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions of pattern timings")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="Export worker processes")
+    parser.add_argument(
+        "--backend", choices=COMPOSITOR_BACKENDS, default="pil", help="Compositing backend"
+    )
+    parser.add_argument(
+        "--encoder", choices=ENCODERS, default="opencv", help="Video encoder of the export run"
+    )
+    parser.add_argument("--skip-export", action="store_true", help="Do not benchmark exports")
+    parser.add_argument("--font", help="Font file used for pane text")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results JSON of an earlier run")
+    return parser
+
+
+def benchmark_main(argv):
+    args = build_benchmark_parser().parse_args(argv)
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in DATASET_KINDS]
+    if not kinds or unknown:
+        print(f"Unknown frame kinds: {', '.join(unknown) or '(none given)'}", file=sys.stderr)
+        return 1
+
+    directory = args.data or tempfile.mkdtemp(prefix="tkFV-bench-data-")
+    os.makedirs(directory, exist_ok=True)
+    frame_width, frame_height = args.frame_size
+    width, height = args.size
+
+    try:
+        print(f"Preparing dataset in {directory}", file=sys.stderr)
+        generate_dataset(directory, kinds, args.frames, frame_width, frame_height)
+        panes = build_panes(directory, kinds, args.layout)
+
+        results = {}
+        print("Timing pattern resolution", file=sys.stderr)
+        results.update(bench_patterns(directory, panes, args.repeat))
+        print("Timing frame composition", file=sys.stderr)
+        results.update(
+            bench_compose(args.layout, panes, args.frames, width, height, args.font, args.backend)
+        )
+        if not args.skip_export:
+            print("Timing video export", file=sys.stderr)
+            results.update(
+                bench_export(
+                    args.layout, panes, args.frames, width, height, args.font, args.workers,
+                    args.backend, args.encoder,
+                )
+            )
+    finally:
+        if args.data is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "tkFV": package_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {
+            "kinds": kinds,
+            "frames": args.frames,
+            "frame_size": [frame_width, frame_height],
+            "layout": args.layout,
+            "size": [width, height],
+            "workers": args.workers,
+            "backend": args.backend,
+            "encoder": args.encoder,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
@@ -0,0 +1,292 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+from .profiling import profiler
+from .sources import frame_index, frame_path, load_fitted_frame, load_fitted_frame_array
+
+
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # Default memory budget for decoded pane images
+PREFETCH_WORKERS = min(4, os.cpu_count() or 1)  # Default number of decode threads
+THUMBNAIL_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # Default size cap of the on-disk cache
+THUMBNAIL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "tkFV", "thumbnails")
+
+
+def default_thumbnail_directory():
+    """Return the thumbnail cache directory from $TKFV_THUMBNAIL_CACHE, or the default one"""
+    return os.getenv("TKFV_THUMBNAIL_CACHE") or THUMBNAIL_CACHE_DIR
+
+
+class ThumbnailCache:
+    """On-disk cache of pane resolution thumbnails, shared between sessions and processes
+
+    Entries are PNG files named after a hash of (source path, frame index,
+    mtime, size, box size) and hold the source resolution in a text chunk.
+    Hits refresh an entry's mtime; once the cache grows past `max_bytes` the least recently
+    used entries are deleted until it is back under 90% of the cap.
+    """
+
+    def __init__(self, directory, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.current_bytes = None  # Measured on first write
+        self.write_failed = False  # Whether a write error was reported, only the first one is
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def entry_path(self, key):
+        file_path, index, mtime_ns, size, box_width, box_height = key
+        name = f"{os.path.abspath(file_path)}|{index}|{mtime_ns}|{size}|{box_width}x{box_height}"
+        digest = hashlib.sha1(name.encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + ".png")
+
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with Image.open(path) as img:
+                img.load()
+                original_size = tuple(map(int, img.text["source_size"].split("x")))
+                thumbnail = img.convert("RGB")
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            return None
+        return thumbnail, original_size
+
+    def put(self, key, value):
+        img, (img_width, img_height) = value
+        path = self.entry_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        info = PngImagePlugin.PngInfo()
+        info.add_text("source_size", f"{img_width}x{img_height}")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            img.save(temp_path, "PNG", pnginfo=info, compress_level=1)
+            # Atomic, so concurrent readers and writers never see a partial entry
+            os.replace(temp_path, path)
+            self.account(os.path.getsize(path))
+        except OSError as e:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            # Writes fail for every entry alike (disk full, read-only), so warn once
+            if not self.write_failed:
+                self.write_failed = True
+                print(f"Thumbnail cache write error, entries are not cached: {str(e)}")
+
+    def account(self, size):
+        with self.lock:
+            if self.current_bytes is None:
+                self.current_bytes = sum(size for _, _, size in self.list_entries())
+            else:
+                self.current_bytes += size
+
+            if self.current_bytes > self.max_bytes:
+                self.evict()
+
+    def list_entries(self):
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".png"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, os.path.join(root, name), stat.st_size))
+        return entries
+
+    def evict(self):
+        # Re-measure, other processes may have written or evicted entries meanwhile
+        entries = sorted(self.list_entries())
+        self.current_bytes = sum(size for _, _, size in entries)
+
+        target = self.max_bytes * 0.9
+        for _, path, size in entries:
+            if self.current_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.current_bytes -= size
+
+
+def image_nbytes(img):
+    if isinstance(img, np.ndarray):
+        return img.nbytes
+    return img.width * img.height * len(img.getbands())
+
+
+class DecodeCache:
+    """Bounded LRU of decoded and resized frames keyed by (path, index, mtime, size, box size)
+
+    If a ThumbnailCache is set as `disk_cache`, misses are looked up on disk
+    before decoding the source, and decoded thumbnails are written back to it.
+    With `arrays`, frames are decoded with OpenCV and held as RGB NumPy arrays
+    instead of PIL images (for the OpenCV compositor).
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, workers=PREFETCH_WORKERS, disk_cache=None,
+                 arrays=False):
+        self.arrays = arrays
+        self.disk_cache = disk_cache
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()
+        self.sources = {}  # (path, index, mtime, size) -> cached box sizes, see peek()
+        self.pending = {}
+        self.hits = 0  # get() calls served from memory
+        self.misses = 0  # get() calls that waited for a prefetch or decoded
+        self.lock = threading.RLock()  # Re-entrant: cancelling a future runs its callback inline
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tkFV-decode")
+
+    def make_key(self, entry, box_width, box_height):
+        file_path = frame_path(entry)
+        stat = os.stat(file_path)
+        return (
+            file_path, frame_index(entry), stat.st_mtime_ns, stat.st_size, box_width, box_height
+        )
+
+    def get(self, entry, box_width, box_height):
+        """Return (image, original size) of a pane entry, decoding it on a miss"""
+        key = self.make_key(entry, box_width, box_height)
+
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+            future = self.pending.get(key)
+
+        # Wait for an in-flight prefetch instead of decoding the same file twice
+        if future is not None and not future.cancelled():
+            try:
+                return future.result()
+            except Exception:
+                pass
+
+        return self.load(key)
+
+    def peek(self, entry):
+        """Return the largest cached (image, original size) of a pane entry at any box size
+
+        Never decodes: returns None if the entry is not in memory at any size.
+        """
+        source = self.make_key(entry, 0, 0)[:4]
+        with self.lock:
+            box_sizes = self.sources.get(source)
+            if not box_sizes:
+                return None
+            return self.entries[source + max(box_sizes)]
+
+    def load(self, key):
+        disk_cache = self.disk_cache
+        value = None
+        if disk_cache is not None:
+            with profiler.stage("thumbnail_read"):
+                value = disk_cache.get(key)
+            if value is not None and self.arrays:
+                value = (np.asarray(value[0]), value[1])
+
+        if value is None:
+            file_path, index, _, _, box_width, box_height = key
+            loader = load_fitted_frame_array if self.arrays else load_fitted_frame
+            with profiler.stage("decode", file=os.path.basename(file_path), index=index):
+                value = loader(file_path, index, box_width, box_height)
+            if disk_cache is not None:
+                with profiler.stage("thumbnail_write"):
+                    img, original_size = value
+                    if self.arrays:
+                        img = Image.fromarray(img)
+                    disk_cache.put(key, (img, original_size))
+
+        self.store(key, value)
+        return value
+
+    def store(self, key, value):
+        size = image_nbytes(value[0])
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return
+            self.entries[key] = value
+            self.sources.setdefault(key[:4], set()).add(key[4:])
+            self.current_bytes += size
+
+            # Evict least recently used entries until we are within budget
+            while self.current_bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, (old_img, _) = self.entries.popitem(last=False)
+                self.current_bytes -= image_nbytes(old_img)
+                box_sizes = self.sources[old_key[:4]]
+                box_sizes.discard(old_key[4:])
+                if not box_sizes:
+                    del self.sources[old_key[:4]]
+
+    def prefetch(self, requests):
+        """Schedule background decoding of (entry, box_width, box_height) requests
+
+        Pending prefetches that are no longer requested and have not started yet
+        are cancelled, so scrubbing away from a region does not waste decode time.
+        """
+        wanted = set()
+        for entry, box_width, box_height in requests:
+            try:
+                key = self.make_key(entry, box_width, box_height)
+            except OSError:
+                continue
+
+            wanted.add(key)
+            with self.lock:
+                if key in self.entries or key in self.pending:
+                    continue
+                future = self.executor.submit(self.load, key)
+                self.pending[key] = future
+            future.add_done_callback(lambda f, key=key: self.on_prefetch_done(key))
+
+        with self.lock:
+            for key, future in list(self.pending.items()):
+                if key not in wanted and future.cancel():
+                    self.pending.pop(key, None)
+
+    def cancel_prefetch(self):
+        """Cancel the prefetches that have not started yet"""
+        with self.lock:
+            for key, future in list(self.pending.items()):
+                if future.cancel():
+                    self.pending.pop(key, None)
+
+    def on_prefetch_done(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def hit_rate(self):
+        """Return the fraction of get() calls served from memory, or None before the first"""
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self.lock:
+            for future in list(self.pending.values()):
+                future.cancel()
+            self.pending.clear()
+            self.entries.clear()
+            self.sources.clear()
+            self.current_bytes = 0
+
+    def shutdown(self):
+        self.clear()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,246 @@
+import os
+import sys
+import argparse
+
+from .alignment import ALIGN_MODES, Timeline
+from .cache import DecodeCache, ThumbnailCache, default_thumbnail_directory
+from .compositor import COMPOSITOR_BACKENDS, make_compositor
+from .config import load_config_file
+from .fonts import FontRegistry
+from .encoders import ENCODERS, FFMPEG_CRF, FFMPEG_PRESET, make_encoder
+from .export import export_frame, export_video, select_frames
+from .jobs import ExportJob
+from .profiling import profiler
+
+IMAGE_OUTPUT_EXTENSIONS = [".png", ".jpg", ".jpeg", ".bmp"]
+
+
+def parse_size(value):
+    try:
+        width, height = map(int, value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size '{value}', expected WIDTHxHEIGHT")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"Invalid size '{value}', must be positive")
+    return width, height
+
+
+def build_render_parser():
+    parser = argparse.ArgumentParser(
+        prog="tkFV render",
+        description="Render a saved tkFV configuration to a video, an image sequence or a "
+        "single frame without starting the GUI.",
+    )
+    parser.add_argument("config", help="Configuration JSON written by 'Save Configuration'")
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="Output path: a video (.mp4/.avi), an animation (.gif/.webp), an image (.png/.jpg) "
+        "for a single frame, or a printf-style pattern such as frames/%%06d.png for an image "
+        "sequence",
+    )
+    parser.add_argument(
+        "-s", "--size", type=parse_size, default=(1600, 1200), help="Output size, e.g. 1920x1080"
+    )
+    parser.add_argument("--fps", type=float, help="Video frame rate (defaults to the config's)")
+    parser.add_argument(
+        "--encoder",
+        choices=ENCODERS,
+        default="opencv",
+        help="Video encoder: OpenCV's mp4v writer, or x264 through a local ffmpeg",
+    )
+    parser.add_argument(
+        "--crf", type=int, default=FFMPEG_CRF, help="x264 quality for --encoder ffmpeg"
+    )
+    parser.add_argument(
+        "--preset", default=FFMPEG_PRESET, help="x264 preset for --encoder ffmpeg"
+    )
+    parser.add_argument(
+        "--encoder-threads",
+        type=int,
+        default=0,
+        help="ffmpeg encoding threads for --encoder ffmpeg (0 = automatic)",
+    )
+    parser.add_argument(
+        "--frame", type=int, default=0, help="Frame index to render for single-image output"
+    )
+    parser.add_argument(
+        "--start", type=int, default=0, help="First frame to export (negative counts from the end)"
+    )
+    parser.add_argument("--end", type=int, help="Frame to stop before (defaults to the last one)")
+    parser.add_argument("--stride", type=int, default=1, help="Export every Nth frame")
+    parser.add_argument(
+        "--max-duration", type=float, metavar="SECONDS", help="Cut the export to this length"
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes rendering frames in parallel (0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Export videos and image sequences in segments and continue an interrupted "
+        "export from its last finished segment",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=COMPOSITOR_BACKENDS,
+        default="pil",
+        help="Compositing backend: PIL images, or NumPy arrays resized with OpenCV",
+    )
+    parser.add_argument(
+        "--font", help="Font file used for pane text (defaults to $TKFV_FONT, then Arial/DejaVu)"
+    )
+    parser.add_argument(
+        "--thumbnail-cache",
+        nargs="?",
+        const=default_thumbnail_directory(),
+        default=os.getenv("TKFV_THUMBNAIL_CACHE"),
+        metavar="DIR",
+        help="Reuse pane thumbnails from an on-disk cache (default directory: "
+        "$TKFV_THUMBNAIL_CACHE or ~/.cache/tkFV/thumbnails)",
+    )
+    parser.add_argument(
+        "--thumbnail-cache-size",
+        type=int,
+        default=2048,
+        metavar="MB",
+        help="Size cap of the on-disk thumbnail cache in MB",
+    )
+    parser.add_argument(
+        "--align",
+        choices=ALIGN_MODES,
+        help="How pane frames are matched (defaults to the config's, else by position)",
+    )
+    parser.add_argument(
+        "--align-key",
+        metavar="REGEX",
+        help="Regex whose first group is the numeric frame key (defaults to the last number)",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="Write per-stage timings as a Chrome trace JSON file and print a summary "
+        "(with -j, frames rendered by worker processes show up as wait_chunk)",
+    )
+    parser.add_argument(
+        "--base-dir", help="Override the base directory stored in the configuration"
+    )
+    return parser
+
+
+def print_progress(message):
+    print(f"\r{message}", end="", file=sys.stderr, flush=True)
+
+
+def render_main(argv):
+    args = build_render_parser().parse_args(argv)
+
+    config_data, panes = load_config_file(args.config, base_directory=args.base_dir)
+    layout = config_data.get("layout", "1x1")
+    width, height = args.size
+
+    align_mode = args.align or config_data.get("align_mode", "position")
+    align_key = args.align_key if args.align_key is not None else config_data.get("align_key")
+    try:
+        timeline = Timeline(panes, align_mode, align_key)
+    except ValueError as e:
+        print(f"Invalid frame alignment: {e}", file=sys.stderr)
+        return 1
+    frame_count = len(timeline)
+
+    if frame_count == 0:
+        print("No files matched the configured patterns", file=sys.stderr)
+        return 1
+
+    disk_cache = None
+    if args.thumbnail_cache:
+        disk_cache = ThumbnailCache(args.thumbnail_cache, args.thumbnail_cache_size * 1024 * 1024)
+    decode_cache = DecodeCache(disk_cache=disk_cache, arrays=args.backend == "opencv")
+    compositor = make_compositor(args.backend, decode_cache, FontRegistry(args.font))
+    profiler.enabled = bool(args.trace)
+    output_ext = os.path.splitext(args.output)[1].lower()
+
+    if "%" not in args.output and output_ext in IMAGE_OUTPUT_EXTENSIONS:
+        if not 0 <= args.frame < frame_count:
+            print(f"Frame {args.frame} out of range (0-{frame_count - 1})", file=sys.stderr)
+            return 1
+        export_frame(compositor, layout, panes, args.frame, width, height, args.output, timeline)
+    else:
+        # Videos, animations and image sequences all go through an encoder
+        options = {}
+        if args.encoder == "ffmpeg":
+            options = dict(crf=args.crf, preset=args.preset, threads=args.encoder_threads)
+        encoder = make_encoder(args.output, args.encoder, **options)
+
+        fps = args.fps if args.fps is not None else float(config_data.get("fps", 5))
+        workers = args.workers if args.workers > 0 else os.cpu_count() or 1
+        try:
+            frame_indices = select_frames(
+                frame_count, args.start, args.end, args.stride, fps, args.max_duration
+            )
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        if not frame_indices:
+            print("The frame selection is empty", file=sys.stderr)
+            return 1
+
+        if args.resume:
+            job = ExportJob(
+                compositor, layout, panes, timeline, frame_indices, width, height, fps,
+                args.output, workers, args.encoder, options,
+            )
+            job.on_change = lambda job: print_progress(job.message)
+            try:
+                job.run()
+            except KeyboardInterrupt:
+                print("\nInterrupted, run again with --resume to continue", file=sys.stderr)
+                return 1
+            if job.state == "failed":
+                print(f"\nExport failed: {job.error}", file=sys.stderr)
+                return 1
+            print(file=sys.stderr)
+        else:
+            try:
+                export_video(
+                    compositor, layout, panes, frame_count, width, height, fps, args.output,
+                    print_progress, workers, timeline, encoder, frame_indices,
+                )
+            except IOError as e:
+                print(f"\nExport failed: {e}", file=sys.stderr)
+                return 1
+            print(file=sys.stderr)
+
+    print(f"Rendered to {args.output}", file=sys.stderr)
+
+    if args.trace:
+        profiler.save_trace(args.trace)
+        for stage, (count, mean_ms) in sorted(profiler.summary().items()):
+            print(f"{stage:>16}: {count:6d} x {mean_ms:8.2f} ms", file=sys.stderr)
+        print(f"Trace written to {args.trace}", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv and argv[0] == "render":
+        sys.exit(render_main(argv[1:]))
+    if argv and argv[0] == "benchmark":
+        from .benchmark import benchmark_main
+
+        sys.exit(benchmark_main(argv[1:]))
+
+    # The GUI is only imported when it is actually needed, so rendering works without Tk
+    from .tkFV import main as gui_main
+
+    gui_main()
+
+
+if __name__ == "__main__":
+    main()
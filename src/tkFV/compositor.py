@@ -0,0 +1,736 @@
+import os
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .alignment import Timeline
+from .cache import DecodeCache
+from .config import parse_layout
+from .derived import derive_frame, is_derived, parse_derived
+from .fonts import FontRegistry
+from .profiling import profiler
+from .sources import (
+    ARRAY_EXTENSIONS,
+    IMAGE_EXTENSIONS,
+    VIDEO_EXTENSIONS,
+    frame_extension,
+    fit_size,
+    frame_index,
+    frame_name,
+    frame_path,
+    frame_size,
+    get_text_file,
+    is_decodable,
+)
+from .tiles import TileCache, ZoomView
+
+
+TEXT_EXTENSIONS = [".txt", ".py", ".js", ".html", ".css", ".json", ".xml", ".log", ".csv"]
+TEXT_CACHE_ENTRIES = 64  # Laid out text pane contents kept for reuse
+LABEL_CACHE_ENTRIES = 256  # Rendered text labels kept by the OpenCV compositor
+COMPOSITOR_BACKENDS = ["pil", "opencv"]
+
+
+class Compositor:
+    """Renders a frame of a pane layout into a PIL image, independent of any GUI toolkit"""
+
+    backend = "pil"
+
+    def __init__(self, decode_cache=None, fonts=None, tile_cache=None):
+        self.decode_cache = decode_cache if decode_cache is not None else DecodeCache()
+        self.fonts = fonts if fonts is not None else FontRegistry()
+        self.tile_cache = tile_cache if tile_cache is not None else TileCache()
+        self.chrome = {}  # (kind, width, height, pane_num) -> pre-rendered pane background
+        self.text_layouts = OrderedDict()  # (path, size, mtime, width, height, follow) -> image
+        self.pane_times = {}  # Pane number -> milliseconds spent drawing it in the last render
+        self.preview_missed = False  # Whether the pane being drawn lacked a cached decode
+
+        # Buffers reused across frames, see allocate()
+        self.buffer_key = None
+        self.canvas_img = None
+        self.rects = []
+        self.pane_buffers = []
+        self.pane_states = []  # Per pane slot: what its rectangle of the composite shows
+        self.dirty_rects = []  # Rectangles redrawn by the last render
+
+    def pane_rects(self, layout, width, height):
+        """Return the (x, y, pane_width, pane_height) rectangle of each pane slot"""
+        rows, cols = parse_layout(layout)
+        pane_width = width // cols
+        pane_height = height // rows
+        return [
+            ((i % cols) * pane_width, (i // cols) * pane_height, pane_width, pane_height)
+            for i in range(rows * cols)
+        ]
+
+    def allocate(self, layout, width, height):
+        """(Re)allocate the composite and per-pane buffers for a layout and size"""
+        self.buffer_key = (layout, width, height)
+        self.chrome.clear()
+        self.canvas_img = Image.new("RGB", (width, height), "black")
+        self.rects = self.pane_rects(layout, width, height)
+        self.pane_states = [None] * len(self.rects)
+        self.pane_buffers = []
+        for _, _, pane_width, pane_height in self.rects:
+            pane_img = Image.new("RGB", (pane_width, pane_height), "black")
+            self.pane_buffers.append((pane_img, ImageDraw.Draw(pane_img)))
+
+    def render(self, layout, panes, frame_idx, width, height, timeline=None, preview=False,
+               view=None):
+        """Compose frame `frame_idx` of the given panes into a width x height image
+
+        `timeline` maps the frame index to each pane's entry; by default panes
+        are matched by list position. With `preview`, image panes show any
+        cached decode of their entry (whatever its size) and never decode;
+        entries that are not cached show a placeholder until they are (see
+        prefetch). A zoomed tiles.ZoomView shows the same region of every
+        image pane.
+
+        Frames are drawn into buffers that are only reallocated when the layout
+        or size changes, so the returned image (see output()) is overwritten by
+        the next call.
+        A Compositor must therefore not be shared between threads.
+
+        Panes whose slot shows the same thing as in the previous render (same
+        entry, file mtime and size, view and options) are not drawn again;
+        `dirty_rects` lists the rectangles that were.
+        """
+        render_start = time.perf_counter()
+        if self.buffer_key != (layout, width, height):
+            self.allocate(layout, width, height)
+
+        if timeline is None:
+            timeline = Timeline(panes)
+
+        # Draw each pane whose content changed since the last render
+        self.dirty_rects = []
+        view_state = (view.zoom, view.center_x, view.center_y) if view and view.zoomed else None
+        for i, rect in enumerate(self.rects):
+            config = panes.get(i)
+            if config is None or not config.enabled:
+                if self.update_state(i, rect, ("clear",)):
+                    self.clear_pane(rect)
+                continue
+
+            if is_derived(config.pattern):
+                state = ("derived", config.pattern, preview, view_state) + tuple(
+                    self.derived_sources(config.pattern, panes, timeline, frame_idx)
+                )
+                if not self.update_state(i, rect, state):
+                    self.pane_times[i + 1] = 0.0
+                    continue
+                start = time.perf_counter()
+                self.preview_missed = False
+                self.draw_derived_pane(i, rect, config.pattern, panes, timeline, frame_idx,
+                                       preview, view)
+            else:
+                entry = self.pane_entry(i, config, timeline, frame_idx)
+                if entry is None:
+                    # Empty panes are entirely static, so their chrome goes onto the composite
+                    if self.update_state(i, rect, ("empty",)):
+                        self.paste_chrome("empty", rect, i + 1)
+                    continue
+
+                state = ("file", entry_state(entry), config.follow, preview, view_state)
+                if not self.update_state(i, rect, state):
+                    self.pane_times[i + 1] = 0.0
+                    continue
+                start = time.perf_counter()
+                self.preview_missed = False
+                self.draw_file_pane(i, rect, entry, config.follow, preview, view)
+            if self.preview_missed:
+                # A placeholder was drawn, draw the pane again once its decode is cached
+                self.pane_states[i] = None
+            end = time.perf_counter()
+            self.pane_times[i + 1] = (end - start) * 1000
+            profiler.record("pane", start, end, {"pane": i + 1})
+
+        profiler.record("composite", render_start, time.perf_counter(), {"frame": frame_idx})
+        return self.output()
+
+    def update_state(self, i, rect, state):
+        """Record what pane slot `i` is about to show; returns False if it already shows it"""
+        if self.pane_states[i] == state:
+            return False
+        self.pane_states[i] = state
+        self.dirty_rects.append(rect)
+        return True
+
+    def invalidate(self):
+        """Draw every pane again on the next render"""
+        self.pane_states = [None] * len(self.rects)
+
+    def derived_sources(self, pattern, panes, timeline, frame_idx):
+        """Return the entry states a derived pane is computed from, for change tracking"""
+        try:
+            sources = parse_derived(pattern).sources
+        except ValueError:
+            return []
+        states = []
+        for source in sources:
+            config = panes.get(source)
+            entry = None
+            if config is not None and config.enabled and not is_derived(config.pattern):
+                entry = self.pane_entry(source, config, timeline, frame_idx)
+            states.append(entry_state(entry) if entry is not None else None)
+        return states
+
+    def pane_entry(self, i, config, timeline, frame_idx):
+        """Return the entry pane `i` shows at a frame; followed panes keep showing their newest"""
+        entry = timeline.entry(i, frame_idx)
+        if entry is None and config.follow and config.files:
+            entry = config.files[-1]
+        return entry
+
+    def derive(self, pattern, panes, timeline, frame_idx, width, height, preview, view=None):
+        """Compute the frame of a derived pane from its source panes' decoded frames
+
+        Sources are decoded at this pane's image box size, which for a grid of
+        equal panes is the size their own panes already decoded them at, so a
+        derived pane adds no decoding of its own. Returns the frame (None if a
+        source has nothing to show) and a line of info text.
+        """
+        spec = parse_derived(pattern)
+        box_width, box_height = self.image_box_size(width, height)
+        frames = []
+        for source in spec.sources:
+            config = panes.get(source)
+            if config is None or not config.enabled or is_derived(config.pattern):
+                raise ValueError(f"Pane {source + 1} is not an enabled file pane")
+            entry = self.pane_entry(source, config, timeline, frame_idx)
+            if entry is None:
+                return None, f"Pane {source + 1} has no frame here"
+            if not is_decodable(entry):
+                raise ValueError(f"Pane {source + 1} does not show images")
+
+            if view is not None and view.zoomed:
+                cached = self.zoomed_frame(entry, view, box_width, box_height, preview)
+            elif preview:
+                cached = self.decode_cache.peek(entry)
+            else:
+                cached = self.decode_cache.get(entry, box_width, box_height)
+            if cached is None:
+                self.preview_missed = True
+                return None, f"Pane {source + 1} is decoding..."
+            frame, _ = cached
+            frames.append(np.asarray(frame))
+
+        with profiler.stage("derive", op=spec.op):
+            return derive_frame(spec, frames[0], frames[1], box_width, box_height)
+
+    def draw_derived_pane(self, i, rect, pattern, panes, timeline, frame_idx, preview,
+                          view=None):
+        """Draw derived pane `i` (see derived.py) in its buffer and paste it onto the composite"""
+        x, y, width, height = rect
+        pane_img, draw = self.pane_buffers[i]
+        pane_img.paste(self.pane_chrome("file", width, height, i + 1))
+        draw.text((5, 5), self.header_text(i + 1, pattern.strip()), fill="yellow",
+                  font=self.fonts.get(12))
+
+        content_y = 25
+        content_height = height - 25
+        try:
+            frame, info_text = self.derive(
+                pattern, panes, timeline, frame_idx, width, content_height, preview, view
+            )
+            if frame is not None:
+                new_height, new_width = frame.shape[:2]
+                paste_x = (width - new_width) // 2
+                paste_y = content_y + (content_height - new_height - 20) // 2
+                pane_img.paste(Image.fromarray(frame), (paste_x, paste_y))
+            draw.text((5, content_y + content_height - 15), info_text, fill="cyan",
+                      font=self.fonts.get(10))
+        except Exception as e:
+            draw.text((5, content_y + 10), f"Derived pane error: {str(e)}", fill="red",
+                      font=self.fonts.get(10))
+
+        self.canvas_img.paste(pane_img, (x, y))
+
+    def clear_pane(self, rect):
+        x, y, pane_width, pane_height = rect
+        self.canvas_img.paste((0, 0, 0), (x, y, x + pane_width, y + pane_height))
+
+    def paste_chrome(self, kind, rect, pane_num):
+        x, y, pane_width, pane_height = rect
+        self.canvas_img.paste(self.pane_chrome(kind, pane_width, pane_height, pane_num), (x, y))
+
+    def draw_file_pane(self, i, rect, entry, follow, preview, view=None):
+        """Draw pane `i` showing `entry` in its buffer and paste it onto the composite"""
+        x, y, _, _ = rect
+        pane_img, draw = self.pane_buffers[i]
+        self.create_file_pane(pane_img, draw, entry, i + 1, follow, preview, view)
+        self.canvas_img.paste(pane_img, (x, y))
+
+    def output(self):
+        return self.canvas_img
+
+    def prefetch(self, layout, panes, frame_indices, width, height, timeline=None, view=None):
+        """Decode the image and array panes of the given frames in the background
+
+        Under a zoomed `view` the tiles the panes show are prepared instead of
+        fitted decodes, on the decode cache's worker threads.
+        """
+        _, _, pane_width, pane_height = self.pane_rects(layout, width, height)[0]
+        box_width, box_height = self.image_box_size(pane_width, pane_height - 25)
+        if box_width <= 0 or box_height <= 0:
+            return
+
+        if timeline is None:
+            timeline = Timeline(panes)
+
+        requests = []
+        for frame_idx in frame_indices:
+            for i in panes:
+                entry = timeline.entry(i, frame_idx)
+                if entry is not None and is_decodable(entry):
+                    requests.append((entry, box_width, box_height))
+
+        if view is None or not view.zoomed:
+            self.tile_cache.prefetch([], self.decode_cache.executor)
+            self.decode_cache.prefetch(requests)
+            return
+
+        # A copy, the view keeps changing while the prefetches are queued
+        view = ZoomView(view.zoom, view.center_x, view.center_y)
+        tile_requests = []
+        for entry, box_width, box_height in requests:
+            try:
+                source = self.decode_cache.make_key(entry, 0, 0)[:4]
+            except OSError:
+                continue
+            tile_requests.append((source, view, box_width, box_height))
+        self.decode_cache.prefetch([])
+        self.tile_cache.prefetch(tile_requests, self.decode_cache.executor)
+
+    def pane_chrome(self, kind, width, height, pane_num):
+        """Return the static background of a pane, rendered once per pane size"""
+        key = (kind, width, height, pane_num)
+        chrome = self.chrome.get(key)
+        if chrome is None:
+            chrome = Image.new("RGB", (width, height), "black")
+            draw = ImageDraw.Draw(chrome)
+
+            if kind == "empty":
+                font = self.fonts.get(12)
+                draw.rectangle([0, 0, width - 1, height - 1], outline="gray")
+                draw.text((5, 5), f"Pane {pane_num}: No file", fill="gray", font=font)
+                draw.text((width // 2 - 30, height // 2), "Empty", fill="gray", font=font)
+            else:
+                draw.rectangle([0, 0, width - 1, height - 1], outline="white")
+
+            self.chrome[key] = chrome
+        return chrome
+
+    def image_box_size(self, width, height):
+        # Leave 5px padding on each side and space for image info text
+        return width - 10, height - 30
+
+    def create_file_pane(self, pane_img, draw, entry, pane_num, follow=False, preview=False,
+                         view=None):
+        """Draw a single pane displaying a file (or a frame of one) into its reused pane buffer
+
+        With `follow`, text files show their last lines instead of their start.
+        `preview` and `view` are passed on to draw_image_content_on_pane.
+        """
+        width, height = pane_img.size
+        font = self.fonts.get(12)
+        small_font = self.fonts.get(10)
+
+        # Start from the pre-rendered border
+        pane_img.paste(self.pane_chrome("file", width, height, pane_num))
+
+        try:
+            # File info
+            file_path = frame_path(entry)
+            filename = frame_name(entry)
+            file_ext = frame_extension(entry)
+
+            # Draw pane number and filename
+            draw.text((5, 5), self.header_text(pane_num, filename), fill="yellow", font=font)
+
+            content_y = 25
+            content_height = height - 25
+
+            # Handle different file types
+            if file_ext in IMAGE_EXTENSIONS + ARRAY_EXTENSIONS + VIDEO_EXTENSIONS:
+                self.draw_image_content_on_pane(
+                    pane_img, draw, entry, 0, content_y, width, content_height, preview, view
+                )
+            elif file_ext in TEXT_EXTENSIONS:
+                self.draw_text_content(
+                    pane_img, draw, file_path, 0, content_y, width, content_height, small_font,
+                    follow,
+                )
+            else:
+                self.draw_generic_content(
+                    draw, file_path, 0, content_y, width, content_height, font
+                )
+
+        except Exception as e:
+            draw.text((5, 30), f"Error: {str(e)}", fill="red", font=font)
+            print(f"Error in create_file_pane: {str(e)}")  # Debug print
+
+    def draw_image_content_on_pane(self, pane_img, draw, entry, x, y, width, height,
+                                   preview=False, view=None):
+        """Load and draw actual image (or array) content onto the pane
+
+        A `preview` uses a decode of the entry cached at any size and never
+        decodes, so scrubbing stays responsive over frames that were never
+        shown; without one a placeholder is drawn. A zoomed `view` shows its
+        region of the image, drawn from the tile cache.
+        """
+        try:
+            # Calculate scaling to fit within the content area with padding
+            content_width, content_height = self.image_box_size(width, height)
+
+            if view is not None and view.zoomed:
+                cached = self.zoomed_frame(entry, view, content_width, content_height, preview)
+                if cached is not None:
+                    cached = (Image.fromarray(cached[0]), cached[1])
+            else:
+                cached = self.decode_cache.peek(entry) if preview else None
+            if preview and cached is None:
+                self.preview_missed = True
+                draw.text((x + 5, y + height - 15), "Decoding...", fill="gray",
+                          font=self.fonts.get(10))
+                return
+
+            if view is not None and view.zoomed:
+                img_resized, (img_width, img_height) = cached
+            elif cached is not None:
+                img_resized, (img_width, img_height) = cached
+                if img_resized.width > content_width or img_resized.height > content_height:
+                    preview_size = fit_size(
+                        img_resized.width, img_resized.height, content_width, content_height
+                    )
+                    img_resized = img_resized.resize(preview_size, Image.BILINEAR)
+            else:
+                # Decoded and resized images come from the cache (or a pending prefetch)
+                img_resized, (img_width, img_height) = self.decode_cache.get(
+                    entry, content_width, content_height
+                )
+            new_width, new_height = img_resized.size
+
+            # Calculate centering position
+            paste_x = x + (width - new_width) // 2
+            paste_y = y + (height - new_height - 20) // 2  # Extra space for info text
+
+            # Paste the actual image onto the pane
+            pane_img.paste(img_resized, (paste_x, paste_y))
+
+            # Draw image info at the bottom
+            info_text = self.image_info(entry, (img_width, img_height), (new_width, new_height))
+            if view is not None and view.zoomed:
+                info_text += f" @ {view.zoom:.1f}x"
+            draw.text((x + 5, y + height - 15), info_text, fill="cyan", font=self.fonts.get(10))
+
+        except Exception as e:
+            # If image loading fails, draw error message
+            draw.text((x + 5, y + 10), f"Image load error: {str(e)}", fill="red")
+            print(f"Image loading error for {frame_name(entry)}: {str(e)}")
+
+    def zoomed_frame(self, entry, view, box_width, box_height, preview=False):
+        """Return the region of an entry visible under a zoomed view, as (RGB array, original size)
+
+        The original size comes from a cached fitted decode of the entry, or
+        else from its header, so only the tile cache decodes. A `preview`
+        only uses cached tiles and returns None if any is missing.
+        """
+        source = self.decode_cache.make_key(entry, 0, 0)[:4]
+        cached = self.decode_cache.peek(entry)
+        if cached is not None:
+            original_size = cached[1]
+        else:
+            original_size = self.tile_cache.original_size(source)
+        if original_size is None:
+            if preview:
+                return None
+            original_size = frame_size(frame_path(entry), frame_index(entry))
+
+        frame = self.tile_cache.render(
+            source, original_size, view, box_width, box_height, decode=not preview
+        )
+        return None if frame is None else (frame, original_size)
+
+    def header_text(self, pane_num, filename):
+        return f"P{pane_num}: {filename[:25]}" + ("..." if len(filename) > 25 else "")
+
+    def image_info(self, entry, original_size, new_size):
+        file_ext = frame_extension(entry)
+        if file_ext in ARRAY_EXTENSIONS:
+            kind = "Array"
+        elif file_ext in VIDEO_EXTENSIONS:
+            kind = "Video"
+        else:
+            kind = "Image"
+        return f"{kind}: {original_size[0]}x{original_size[1]} -> {new_size[0]}x{new_size[1]}"
+
+    def draw_text_content(self, pane_img, draw, file_path, x, y, width, height, font,
+                          follow=False):
+        try:
+            # The file stays open; it is only read again when its size or mtime changes
+            text_file = get_text_file(file_path)
+            file_size, mtime = text_file.stat()
+
+            key = (file_path, file_size, mtime, width, height, follow)
+            layout = self.text_layouts.get(key)
+            if layout is None:
+                with profiler.stage("text_layout"):
+                    layout = self.layout_text(text_file, file_size, width, height, font, follow)
+                self.text_layouts[key] = layout
+                if len(self.text_layouts) > TEXT_CACHE_ENTRIES:
+                    self.text_layouts.popitem(last=False)
+            else:
+                self.text_layouts.move_to_end(key)
+
+            # The layout is inset by one pixel so the pane border stays intact
+            pane_img.paste(layout, (x + 1, y))
+
+        except Exception as e:
+            draw.text((x + 5, y + 10), f"Text error: {str(e)}", fill="red", font=font)
+
+    def layout_text(self, text_file, file_size, width, height, font, follow):
+        """Render the lines and stats of a text pane into an image of its content area"""
+        layout = Image.new("RGB", (width - 2, height - 1), "black")
+        draw = ImageDraw.Draw(layout)
+
+        y_offset = 5
+        line_height = 12
+        max_lines = (height - 30) // line_height
+
+        if follow:
+            lines = text_file.tail(max_lines)
+        else:
+            # Split into lines
+            lines = text_file.head().split("\n")
+
+        for line in lines[:max_lines]:
+            if y_offset + line_height > height - 25:
+                break
+
+            # Truncate long lines
+            max_chars = (width - 10) // 6  # Rough character width estimation
+            if len(line) > max_chars:
+                line = line[: max_chars - 3] + "..."
+
+            draw.text((4, y_offset), line, fill="lightgreen", font=font)
+            y_offset += line_height
+
+        # File stats
+        size_text = f"Size: {file_size} bytes" + (" (following end)" if follow else "")
+        draw.text((4, height - 15), size_text, fill="gray", font=font)
+        return layout
+
+    def draw_generic_content(self, draw, file_path, x, y, width, height, font):
+        try:
+            # File statistics
+            stat = os.stat(file_path)
+            size = stat.st_size
+            modified = time.ctime(stat.st_mtime)
+
+            # Draw file icon
+            icon_size = min(32, width // 3, height // 3)
+            icon_x = x + width // 2 - icon_size // 2
+            icon_y = y + 20
+            draw.rectangle(
+                [icon_x, icon_y, icon_x + icon_size, icon_y + icon_size],
+                outline="white",
+                fill="darkgray",
+            )
+
+            # File info
+            info_lines = [
+                f"Size: {size:,} bytes",
+                f"Modified: {modified.split()[1]} {modified.split()[2]}",
+                f"Type: {os.path.splitext(file_path)[1] or 'No extension'}",
+            ]
+
+            y_offset = icon_y + icon_size + 20
+            for line in info_lines:
+                if y_offset > y + height - 20:
+                    break
+                draw.text((x + 5, y_offset), line, fill="lightgray", font=font)
+                y_offset += 15
+
+        except Exception as e:
+            draw.text((x + 5, y + 10), f"File error: {str(e)}", fill="red", font=font)
+
+
+class ArrayCompositor(Compositor):
+    """Compositor that keeps frames as NumPy arrays end to end
+
+    Image, array and video panes are decoded by OpenCV into RGB arrays
+    (cv2.imread, and cv2.resize with INTER_AREA for downscaling) and copied
+    straight into slices of a single canvas array. Pane chrome and labels are
+    drawn with PIL once and cached as arrays; text and other panes are drawn
+    by the PIL code path and copied in. render() returns the RGB canvas array,
+    so the GUI converts each frame to a Tk image once and exports hand it to
+    OpenCV without a PIL round trip.
+    """
+
+    backend = "opencv"
+
+    def __init__(self, decode_cache=None, fonts=None, tile_cache=None):
+        if decode_cache is None:
+            decode_cache = DecodeCache(arrays=True)
+        elif not decode_cache.arrays:
+            raise ValueError("The OpenCV compositor needs a DecodeCache with arrays=True")
+        super().__init__(decode_cache, fonts, tile_cache)
+        self.chrome_arrays = {}  # (kind, width, height, pane_num) -> pane background array
+        self.labels = OrderedDict()  # (text, font size, color) -> label array
+        self.canvas = None
+
+    def allocate(self, layout, width, height):
+        super().allocate(layout, width, height)
+        self.chrome_arrays.clear()
+        self.canvas = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def chrome_array(self, kind, width, height, pane_num):
+        key = (kind, width, height, pane_num)
+        chrome = self.chrome_arrays.get(key)
+        if chrome is None:
+            chrome = self.chrome_arrays[key] = np.asarray(self.pane_chrome(*key))
+        return chrome
+
+    def label(self, text, size, color):
+        """Return a line of text rendered on black as an array, as draw.text would place it"""
+        key = (text, size, color)
+        label = self.labels.get(key)
+        if label is None:
+            font = self.fonts.get(size)
+            _, _, right, bottom = font.getbbox(text)
+            img = Image.new("RGB", (max(1, right), max(1, bottom)), "black")
+            ImageDraw.Draw(img).text((0, 0), text, fill=color, font=font)
+            label = self.labels[key] = np.asarray(img)
+            if len(self.labels) > LABEL_CACHE_ENTRIES:
+                self.labels.popitem(last=False)
+        else:
+            self.labels.move_to_end(key)
+        return label
+
+    def blit_label(self, view, x, y, text, size, color):
+        # Clip to the pane, leaving its one pixel border intact
+        label = self.label(text, size, color)
+        label = label[: max(0, view.shape[0] - 1 - y), : max(0, view.shape[1] - 1 - x)]
+        view[y : y + label.shape[0], x : x + label.shape[1]] = label
+
+    def clear_pane(self, rect):
+        x, y, pane_width, pane_height = rect
+        self.canvas[y : y + pane_height, x : x + pane_width] = 0
+
+    def paste_chrome(self, kind, rect, pane_num):
+        x, y, pane_width, pane_height = rect
+        chrome = self.chrome_array(kind, pane_width, pane_height, pane_num)
+        self.canvas[y : y + pane_height, x : x + pane_width] = chrome
+
+    def draw_file_pane(self, i, rect, entry, follow, preview, view=None):
+        x, y, pane_width, pane_height = rect
+        pane_view = self.canvas[y : y + pane_height, x : x + pane_width]
+
+        if frame_extension(entry) not in IMAGE_EXTENSIONS + ARRAY_EXTENSIONS + VIDEO_EXTENSIONS:
+            # Text and generic panes are cached or cheap, draw them with PIL and copy them in
+            pane_img, draw = self.pane_buffers[i]
+            self.create_file_pane(pane_img, draw, entry, i + 1, follow, preview)
+            pane_view[:] = np.asarray(pane_img)
+            return
+
+        pane_view[:] = self.chrome_array("file", pane_width, pane_height, i + 1)
+        self.blit_label(
+            pane_view, 5, 5, self.header_text(i + 1, frame_name(entry)), 12, "yellow"
+        )
+
+        content_y = 25
+        content_height = pane_height - 25
+        content_width, box_height = self.image_box_size(pane_width, content_height)
+        try:
+            if view is not None and view.zoomed:
+                cached = self.zoomed_frame(entry, view, content_width, box_height, preview)
+            else:
+                cached = self.decode_cache.peek(entry) if preview else None
+            if preview and cached is None:
+                self.preview_missed = True
+                self.blit_label(
+                    pane_view, 5, content_y + content_height - 15, "Decoding...", 10, "gray"
+                )
+                return
+
+            if view is not None and view.zoomed:
+                frame, original_size = cached
+            elif cached is not None:
+                frame, original_size = cached
+                if frame.shape[1] > content_width or frame.shape[0] > box_height:
+                    preview_size = fit_size(
+                        frame.shape[1], frame.shape[0], content_width, box_height
+                    )
+                    frame = cv2.resize(frame, preview_size, interpolation=cv2.INTER_AREA)
+            else:
+                frame, original_size = self.decode_cache.get(entry, content_width, box_height)
+
+            new_height, new_width = frame.shape[:2]
+            paste_x = (pane_width - new_width) // 2
+            paste_y = content_y + (content_height - new_height - 20) // 2
+            pane_view[paste_y : paste_y + new_height, paste_x : paste_x + new_width] = frame
+
+            info_text = self.image_info(entry, original_size, (new_width, new_height))
+            if view is not None and view.zoomed:
+                info_text += f" @ {view.zoom:.1f}x"
+            self.blit_label(pane_view, 5, content_y + content_height - 15, info_text, 10, "cyan")
+
+        except Exception as e:
+            self.blit_label(
+                pane_view, 5, content_y + 10, f"Image load error: {str(e)}", 10, "red"
+            )
+            print(f"Image loading error for {frame_name(entry)}: {str(e)}")
+
+    def draw_derived_pane(self, i, rect, pattern, panes, timeline, frame_idx, preview,
+                          view=None):
+        x, y, pane_width, pane_height = rect
+        pane_view = self.canvas[y : y + pane_height, x : x + pane_width]
+        pane_view[:] = self.chrome_array("file", pane_width, pane_height, i + 1)
+        self.blit_label(pane_view, 5, 5, self.header_text(i + 1, pattern.strip()), 12, "yellow")
+
+        content_y = 25
+        content_height = pane_height - 25
+        try:
+            frame, info_text = self.derive(
+                pattern, panes, timeline, frame_idx, pane_width, content_height, preview, view
+            )
+            if frame is not None:
+                new_height, new_width = frame.shape[:2]
+                paste_x = (pane_width - new_width) // 2
+                paste_y = content_y + (content_height - new_height - 20) // 2
+                pane_view[paste_y : paste_y + new_height, paste_x : paste_x + new_width] = frame
+            self.blit_label(pane_view, 5, content_y + content_height - 15, info_text, 10, "cyan")
+        except Exception as e:
+            self.blit_label(
+                pane_view, 5, content_y + 10, f"Derived pane error: {str(e)}", 10, "red"
+            )
+
+    def output(self):
+        return self.canvas
+
+
+def entry_state(entry):
+    """Return an entry with the mtime and size of its file, which change when it is rewritten"""
+    try:
+        stat = os.stat(frame_path(entry))
+    except OSError:
+        return entry, None, None
+    return entry, stat.st_mtime_ns, stat.st_size
+
+
+def make_compositor(backend="pil", decode_cache=None, fonts=None, tile_cache=None):
+    """Return a compositor for one of COMPOSITOR_BACKENDS"""
+    if backend == "opencv":
+        return ArrayCompositor(decode_cache, fonts, tile_cache)
+    if backend == "pil":
+        return Compositor(decode_cache, fonts, tile_cache)
+    raise ValueError(f"Unknown compositor backend '{backend}'")
+
+
+def as_image(frame):
+    """Return a rendered frame as a PIL image, converting the array of ArrayCompositor"""
+    return Image.fromarray(frame) if isinstance(frame, np.ndarray) else frame
@@ -0,0 +1,80 @@
+import re
+import os
+import glob
+import json
+
+from .derived import is_derived
+from .filelist import FileList
+from .sources import expand_frames
+
+
+NUMBER_PATTERN = re.compile(r"\d+")  # Digit runs a natural sort orders by
+
+
+class PaneConfig:
+    # The GUI keeps its widgets and scan state of a pane on its config
+    __slots__ = (
+        "pattern", "enabled", "follow", "files",
+        "enabled_var", "follow_var", "pattern_var", "pattern_entry", "count_label",
+        "debounce_id", "scan_job",
+    )
+
+    def __init__(self, pattern="", enabled=True, follow=False):
+        self.pattern = pattern
+        self.enabled = enabled
+        self.follow = follow  # Show the end of text files and keep showing the newest file
+        self.files = FileList()
+        self.enabled_var = self.follow_var = self.pattern_var = None
+        self.pattern_entry = self.count_label = None
+        self.debounce_id = None
+        self.scan_job = None
+
+
+def parse_layout(layout):
+    """Parse a layout string such as "3x2" into (rows, cols)"""
+    rows, cols = map(int, layout.split("x"))
+    return rows, cols
+
+
+def extract_numbers(filename):
+    return tuple(map(int, NUMBER_PATTERN.findall(filename)))
+
+
+def resolve_pattern(base_directory, pattern):
+    """Return the FileList matching a pattern relative to the base directory, in natural order
+
+    Videos and .npy stacks are expanded into one entry per frame, see sources.expand_frames.
+    """
+    full_pattern = os.path.join(base_directory, pattern)
+    files = sorted(glob.glob(full_pattern), key=extract_numbers)
+    return FileList.from_entries(expand_frames(files))
+
+
+def load_config_file(filename, base_directory=None):
+    """Load a configuration written by the GUI's "Save Configuration"
+
+    Returns a tuple of (config data, panes) where panes maps the pane index to
+    a PaneConfig with its file list already resolved. `base_directory`
+    overrides the one stored in the file.
+    """
+    with open(filename, "r") as f:
+        config_data = json.load(f)
+
+    if base_directory is None:
+        base_directory = config_data.get("base_directory", "")
+    rows, cols = parse_layout(config_data.get("layout", "1x1"))
+
+    panes = {}
+    for i in range(rows * cols):
+        pane_data = config_data.get("panes", {}).get(str(i), {})
+        config = PaneConfig(
+            pane_data.get("pattern", ""),
+            pane_data.get("enabled", True),
+            pane_data.get("follow", False),
+        )
+        pattern = config.pattern.strip()
+        if pattern and config.enabled and base_directory and not is_derived(pattern):
+            config.files = resolve_pattern(base_directory, pattern)
+        panes[i] = config
+
+    return config_data, panes
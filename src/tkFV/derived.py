@@ -0,0 +1,89 @@
+import functools
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from .sources import VIRIDIS_LUT, fit_size
+
+
+DERIVED_PREFIX = "="  # Patterns starting with this define a derived pane, e.g. "=diff 1 2"
+DERIVED_OPS = {
+    # Operation -> default of its optional parameter
+    "diff": None,
+    "blend": 0.5,  # Weight of the second pane
+    "checker": 32,  # Square size in pixels
+    "heatmap": 0,  # Error shown at the top of the color map, 0 scales to each frame's maximum
+}
+
+# A pane computed from the decoded frames of two other panes (0-based pane indices)
+DerivedSpec = namedtuple("DerivedSpec", ["op", "sources", "param"])
+
+
+def is_derived(pattern):
+    return pattern.lstrip().startswith(DERIVED_PREFIX)
+
+
+@functools.lru_cache(maxsize=64)
+def parse_derived(pattern):
+    """Parse a derived pane pattern such as "=diff 1 2" or "=blend 1 2 0.3"
+
+    Panes are numbered from 1, as in the pane headers. Raises ValueError for
+    malformed patterns.
+    """
+    parts = pattern.strip()[len(DERIVED_PREFIX) :].split()
+    if not parts or parts[0] not in DERIVED_OPS:
+        raise ValueError(f"Derived panes are one of {', '.join(DERIVED_OPS)}, e.g. '=diff 1 2'")
+    if len(parts) not in (3, 4):
+        raise ValueError(f"Usage: ={parts[0]} <pane> <pane> [parameter]")
+
+    try:
+        sources = (int(parts[1]) - 1, int(parts[2]) - 1)
+        param = float(parts[3]) if len(parts) == 4 else DERIVED_OPS[parts[0]]
+    except ValueError:
+        raise ValueError(f"Invalid pane number or parameter in '{pattern.strip()}'")
+    if min(sources) < 0:
+        raise ValueError("Panes are numbered from 1")
+    return DerivedSpec(parts[0], sources, param)
+
+
+def error_map(a, b):
+    """Per-pixel absolute error averaged over the color channels, as uint8"""
+    return cv2.absdiff(a, b).mean(axis=2, dtype=np.float32).astype(np.uint8)
+
+
+def derive_frame(spec, a, b, box_width, box_height):
+    """Combine two decoded RGB frames into the frame of a derived pane
+
+    Frames are brought to the size of the first one fitted into the box, so
+    buffers decoded at another size (previews) still line up. Returns the
+    frame and a line of info text.
+    """
+    height, width = a.shape[:2]
+    size = (width, height)
+    if width > box_width or height > box_height:
+        size = fit_size(width, height, box_width, box_height)
+    if a.shape[1::-1] != size:
+        a = cv2.resize(a, size, interpolation=cv2.INTER_AREA)
+    if b.shape[1::-1] != size:
+        b = cv2.resize(b, size, interpolation=cv2.INTER_AREA)
+
+    if spec.op == "blend":
+        alpha = min(max(spec.param, 0.0), 1.0)
+        return cv2.addWeighted(a, 1 - alpha, b, alpha, 0), f"blend {alpha:.2f}"
+
+    if spec.op == "checker":
+        tile = max(1, int(spec.param))
+        rows = np.arange(size[1])[:, None] // tile
+        cols = np.arange(size[0])[None, :] // tile
+        return np.where(((rows + cols) % 2 == 0)[..., None], a, b), f"checker {tile}px"
+
+    if spec.op == "diff":
+        diff = cv2.absdiff(a, b)
+        return diff, f"diff, mean abs error {diff.mean():.2f}"
+
+    error = error_map(a, b)
+    scale = spec.param or int(error.max()) or 1
+    if scale != 255:
+        error = np.clip(error * (255.0 / scale), 0, 255).astype(np.uint8)
+    return VIRIDIS_LUT[error], f"heatmap, error 0-{scale:g}"
@@ -0,0 +1,275 @@
+import os
+import shutil
+import threading
+import subprocess
+from queue import Queue
+
+import cv2
+from PIL import Image
+
+from .profiling import profiler
+
+
+ENCODERS = ["opencv", "ffmpeg"]  # Video encoders selectable for .mp4/.avi/... outputs
+ANIMATED_EXTENSIONS = [".gif", ".webp"]
+ENCODE_QUEUE_FRAMES = 16  # Rendered frames buffered ahead of the encoder, bounds memory
+FFMPEG_PRESET = "veryfast"  # x264 preset: faster presets encode quicker into larger files
+FFMPEG_CRF = 23  # x264 constant rate factor: lower is better quality and larger files
+
+
+def find_ffmpeg():
+    """Return the ffmpeg executable from $TKFV_FFMPEG or the PATH, or None"""
+    return os.getenv("TKFV_FFMPEG") or shutil.which("ffmpeg")
+
+
+class OpenCVEncoder:
+    """Writes frames with cv2.VideoWriter, the encoder tkFV always used"""
+
+    def __init__(self, output_path, fourcc="mp4v"):
+        self.output_path = output_path
+        self.fourcc = fourcc
+        self.writer = None
+
+    def open(self, width, height, fps):
+        fourcc = cv2.VideoWriter_fourcc(*self.fourcc)
+        self.writer = cv2.VideoWriter(self.output_path, fourcc, fps, (width, height))
+        if not self.writer.isOpened():
+            raise IOError(f"Could not open video writer for {self.output_path}")
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+class FFmpegEncoder:
+    """Streams raw BGR frames into a local ffmpeg process
+
+    With the default libx264 this is both faster and a lot smaller than mp4v.
+    `threads` 0 lets ffmpeg pick; `extra_args` are added before the output path.
+    """
+
+    def __init__(self, output_path, codec="libx264", preset=FFMPEG_PRESET, crf=FFMPEG_CRF,
+                 threads=0, ffmpeg=None, extra_args=()):
+        self.output_path = output_path
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.threads = threads
+        self.ffmpeg = ffmpeg or find_ffmpeg()
+        self.extra_args = list(extra_args)
+        self.process = None
+
+    def command(self, width, height, fps):
+        command = [
+            self.ffmpeg, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps:g}",
+            "-i", "-",
+            "-c:v", self.codec, "-threads", str(self.threads),
+        ]
+        if self.codec == "libx264":
+            # yuv420p (for players that support nothing else) needs even dimensions
+            command += [
+                "-preset", self.preset, "-crf", str(self.crf), "-pix_fmt", "yuv420p",
+                "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            ]
+        return command + self.extra_args + [self.output_path]
+
+    def open(self, width, height, fps):
+        if not self.ffmpeg:
+            raise IOError("ffmpeg was not found, install it or set TKFV_FFMPEG to its path")
+        self.process = subprocess.Popen(
+            self.command(width, height, fps), stdin=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    def write(self, frame):
+        try:
+            # Rendered frames are C contiguous, so the pipe gets the buffer without a copy
+            self.process.stdin.write(memoryview(frame))
+        except BrokenPipeError:
+            self.close()
+
+    def close(self):
+        process, self.process = self.process, None
+        if process is None:
+            return
+
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        error = process.stderr.read().decode(errors="replace").strip()
+        process.stderr.close()
+        if process.wait() != 0:
+            raise IOError(f"ffmpeg failed: {error or f'exit status {process.returncode}'}")
+
+
+class ImageSequenceEncoder:
+    """Writes every frame to its own file, e.g. "frames/%06d.png"
+
+    PNG output is lossless; `png_compression` (0-9) trades file size for speed.
+    """
+
+    def __init__(self, output_pattern, png_compression=1, start_index=0):
+        self.output_pattern = output_pattern
+        self.params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        self.index = start_index
+
+    def open(self, width, height, fps):
+        directory = os.path.dirname(self.output_pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame):
+        output_path = self.output_pattern % self.index
+        if not cv2.imwrite(output_path, frame, self.params):
+            raise IOError(f"Could not write {output_path}")
+        self.index += 1
+
+    def close(self):
+        pass
+
+
+class AnimatedImageEncoder:
+    """Writes an animated GIF or WebP
+
+    Both formats are written in one go when the encoder is closed, so all
+    frames are held in memory; this is meant for short clips. WebP frames are
+    stored losslessly with `lossless`, GIF frames get an adaptive palette.
+    """
+
+    def __init__(self, output_path, lossless=False, quality=80):
+        self.output_path = output_path
+        self.lossless = lossless
+        self.quality = quality
+        self.frames = []
+        self.duration = 100
+
+    def open(self, width, height, fps):
+        self.duration = max(1, int(round(1000 / fps)))
+
+    def write(self, frame):
+        img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if self.output_path.lower().endswith(".gif"):
+            img = img.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+        self.frames.append(img)
+
+    def close(self):
+        frames, self.frames = self.frames, []
+        if not frames:
+            return
+
+        options = {"save_all": True, "append_images": frames[1:], "duration": self.duration,
+                   "loop": 0}
+        if self.output_path.lower().endswith(".webp"):
+            options.update(lossless=self.lossless, quality=self.quality)
+        frames[0].save(self.output_path, **options)
+
+
+def make_encoder(output_path, encoder="opencv", **options):
+    """Return the encoder for an output path
+
+    "%" patterns give an image sequence, .gif/.webp an animated image and
+    anything else a video written by `encoder`, one of ENCODERS. `options`
+    are passed to the FFmpeg encoder.
+    """
+    if "%" in output_path:
+        return ImageSequenceEncoder(output_path)
+    if os.path.splitext(output_path)[1].lower() in ANIMATED_EXTENSIONS:
+        return AnimatedImageEncoder(output_path)
+    if encoder == "ffmpeg":
+        return FFmpegEncoder(output_path, **options)
+    if encoder == "opencv":
+        return OpenCVEncoder(output_path)
+    raise ValueError(f"Unknown encoder '{encoder}'")
+
+
+def encode_frames(encoder, frames, on_frame=None):
+    """Feed frames to an encoder on a separate thread through a bounded queue
+
+    Rendering (the `frames` iterator, on the calling thread) and encoding then
+    overlap, while at most ENCODE_QUEUE_FRAMES rendered frames wait in memory.
+    `on_frame`, if given, is called from the encoder thread with the number
+    of frames written so far. Encoder errors are raised on the calling thread.
+    """
+    queue = Queue(maxsize=ENCODE_QUEUE_FRAMES)
+    errors = []
+
+    def run():
+        done = 0
+        while True:
+            frame = queue.get()
+            if frame is None:
+                return
+            if errors:
+                continue  # Keep draining so the renderer never blocks on a full queue
+
+            try:
+                with profiler.stage("encode"):
+                    encoder.write(frame)
+                done += 1
+                if on_frame is not None:
+                    on_frame(done)
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=run, name="tkFV-encode", daemon=True)
+    thread.start()
+    try:
+        for frame in frames:
+            if errors:
+                break
+            queue.put(frame)
+    finally:
+        queue.put(None)
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+
+def join_videos(paths, output_path):
+    """Concatenate video files written with identical settings into one video
+
+    With ffmpeg the streams are copied without re-encoding. Without it the
+    frames are decoded and written again by OpenCVEncoder.
+    """
+    ffmpeg = find_ffmpeg()
+    if ffmpeg:
+        list_path = f"{output_path}.concat.txt"
+        with open(list_path, "w") as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        try:
+            result = subprocess.run(
+                [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                 "-i", list_path, "-c", "copy", output_path],
+                stdin=subprocess.DEVNULL, capture_output=True,
+            )
+        finally:
+            os.remove(list_path)
+        if result.returncode != 0:
+            error = result.stderr.decode(errors="replace").strip()
+            raise IOError(f"ffmpeg failed to join segments: {error or result.returncode}")
+        return
+
+    encoder = None
+    try:
+        for path in paths:
+            capture = cv2.VideoCapture(path)
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                if encoder is None:
+                    encoder = OpenCVEncoder(output_path)
+                    encoder.open(frame.shape[1], frame.shape[0], capture.get(cv2.CAP_PROP_FPS))
+                encoder.write(frame)
+            capture.release()
+    finally:
+        if encoder is not None:
+            encoder.close()
@@ -0,0 +1,206 @@
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from .cache import DecodeCache, ThumbnailCache
+from .compositor import as_image, make_compositor
+from .encoders import encode_frames, make_encoder
+from .fonts import FontRegistry
+from .profiling import profiler
+
+
+EXPORT_CHUNK_FRAMES = 8  # Frames rendered per task by a parallel export worker
+EXPORT_CHUNKS_PER_WORKER = 2  # In-flight chunks per worker, bounds reorder buffer memory
+WORKER_CACHE_BYTES = 64 * 1024 * 1024  # Decode cache budget of each export worker process
+
+# Per-process state of parallel export workers, set up by init_export_worker
+worker_state = {}
+
+
+class ExportProgress:
+    """Throttled progress and ETA reporting for exports
+
+    `callback` is called with a human readable message at most every `interval`
+    seconds, and always for the last frame. `resumed` frames were done before
+    this run and do not count towards the frame rate.
+    """
+
+    def __init__(self, total, callback=None, interval=0.5, resumed=0):
+        self.total = total
+        self.callback = callback
+        self.interval = interval
+        self.resumed = resumed
+        self.start_time = time.monotonic()
+        self.last_report = 0.0
+
+    def update(self, done):
+        if self.callback is None:
+            return
+
+        now = time.monotonic()
+        if done < self.total and now - self.last_report < self.interval:
+            return
+        self.last_report = now
+        self.callback(self.format(done, now - self.start_time))
+
+    def format(self, done, elapsed):
+        rate = (done - self.resumed) / elapsed if elapsed > 0 else 0.0
+        message = f"Exporting frame {done}/{self.total} ({rate:.1f} fps"
+        if done < self.total and rate > 0:
+            remaining = int((self.total - done) / rate)
+            message += f", ETA {remaining // 60}m{remaining % 60:02d}s"
+        return message + ")"
+
+
+def select_frames(frame_count, start=0, end=None, stride=1, fps=None, max_duration=None):
+    """Return the frame indices an export covers, as a range
+
+    `start` and the exclusive `end` work like slice bounds, so negative values
+    count from the last frame. With `max_duration` (seconds of output at
+    `fps`) the selection is cut to the frames that fit. Frames outside the
+    selection are never rendered, so they are never decoded either.
+    """
+    if stride < 1:
+        raise ValueError("The frame stride must be at least 1")
+    indices = range(frame_count)[start:end:stride]
+    if max_duration is not None:
+        indices = indices[: max(0, int(max_duration * fps))]
+    return indices
+
+
+def to_bgr(img):
+    # Frames of the OpenCV compositor already are arrays and skip the PIL round trip
+    frame = img if isinstance(img, np.ndarray) else np.asarray(img)
+    return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+
+
+def render_frames(compositor, layout, panes, frame_indices, width, height, timeline=None):
+    """Yield the given frames as BGR arrays, rendered on the calling thread"""
+    for frame_idx in frame_indices:
+        with profiler.stage("render_frame", frame=frame_idx):
+            frame = to_bgr(compositor.render(layout, panes, frame_idx, width, height, timeline))
+        yield frame
+
+
+def init_export_worker(layout, panes, width, height, font_path, thumbnail_cache, timeline=None,
+                       backend="pil"):
+    disk_cache = ThumbnailCache(*thumbnail_cache) if thumbnail_cache is not None else None
+    decode_cache = DecodeCache(
+        max_bytes=WORKER_CACHE_BYTES, workers=1, disk_cache=disk_cache, arrays=backend == "opencv"
+    )
+    worker_state["compositor"] = make_compositor(backend, decode_cache, FontRegistry(font_path))
+    worker_state["args"] = (layout, panes, timeline)
+    worker_state["size"] = (width, height)
+
+
+def render_chunk(frame_indices):
+    compositor = worker_state["compositor"]
+    layout, panes, timeline = worker_state["args"]
+    width, height = worker_state["size"]
+    return list(render_frames(compositor, layout, panes, frame_indices, width, height, timeline))
+
+
+def render_frames_parallel(layout, panes, frame_indices, width, height, workers, font_path=None,
+                           thumbnail_cache=None, timeline=None, backend="pil"):
+    """Yield the given frames as BGR arrays, rendered by a pool of worker processes
+
+    `thumbnail_cache` is an optional (directory, max_bytes) tuple of the
+    on-disk thumbnail cache the workers should use, and `backend` the
+    compositor backend they render with.
+
+    Frame indices are sharded into chunks that are rendered out of order but
+    yielded strictly in sequence. At most EXPORT_CHUNKS_PER_WORKER chunks per
+    worker are in flight, so memory stays bounded however long the export is.
+    """
+    frame_indices = list(frame_indices)
+    chunks = deque(
+        frame_indices[i : i + EXPORT_CHUNK_FRAMES]
+        for i in range(0, len(frame_indices), EXPORT_CHUNK_FRAMES)
+    )
+
+    # Spawn rather than fork: the parent may be a GUI process with live Tk threads
+    context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=init_export_worker,
+        initargs=(layout, panes, width, height, font_path, thumbnail_cache, timeline, backend),
+    )
+
+    try:
+        in_flight = deque()
+        while chunks or in_flight:
+            while chunks and len(in_flight) < workers * EXPORT_CHUNKS_PER_WORKER:
+                in_flight.append(executor.submit(render_chunk, chunks.popleft()))
+
+            # Futures are queued in frame order, so waiting on the oldest one
+            # reassembles the sequence
+            with profiler.stage("wait_chunk"):
+                frames = in_flight.popleft().result()
+            yield from frames
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def render_stream(compositor, layout, panes, frame_indices, width, height, workers=1,
+                  timeline=None):
+    """Return a generator of the given frames as BGR arrays, in order
+
+    With `workers` > 1 they are rendered by that many processes set up like
+    `compositor`, otherwise by `compositor` on the calling thread.
+    """
+    if workers <= 1:
+        return render_frames(compositor, layout, panes, frame_indices, width, height, timeline)
+
+    disk_cache = compositor.decode_cache.disk_cache
+    if disk_cache is not None:
+        thumbnail_cache = (disk_cache.directory, disk_cache.max_bytes)
+    else:
+        thumbnail_cache = None
+    return render_frames_parallel(
+        layout, panes, frame_indices, width, height, workers, compositor.fonts.font_path,
+        thumbnail_cache, timeline, compositor.backend,
+    )
+
+
+def export_video(compositor, layout, panes, frame_count, width, height, fps, output_path,
+                 progress=None, workers=1, timeline=None, encoder=None, frame_indices=None):
+    """Render every frame of the panes into a video file
+
+    `encoder` is one of the encoders in tkFV.encoders; by default it is picked
+    from `output_path` by make_encoder. Frames are handed to it through a
+    bounded queue, so rendering and encoding overlap.
+
+    `timeline` optionally aligns the panes' frames (see alignment.Timeline);
+    `frame_count` should then be its length. Only `frame_indices` (see
+    select_frames) are exported if given. With `workers` > 1 frames are
+    rendered by that many processes. `progress`, if given, is called with a
+    status message as the export advances.
+    """
+    if frame_indices is None:
+        frame_indices = range(frame_count)
+    if encoder is None:
+        encoder = make_encoder(output_path)
+    encoder.open(width, height, fps)
+
+    frames = render_stream(compositor, layout, panes, frame_indices, width, height, workers,
+                           timeline)
+    tracker = ExportProgress(len(frame_indices), progress)
+    try:
+        encode_frames(encoder, frames, tracker.update)
+    finally:
+        frames.close()
+        encoder.close()
+
+
+def export_frame(compositor, layout, panes, frame_idx, width, height, output_path,
+                 timeline=None):
+    """Render a single frame of the panes into an image file"""
+    img = compositor.render(layout, panes, frame_idx, width, height, timeline)
+    with profiler.stage("encode"):
+        as_image(img).save(output_path)
+
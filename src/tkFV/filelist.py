@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+
+from .sources import ARRAY_EXTENSIONS, VIDEO_EXTENSIONS, FrameRef, expand_frames
+
+
+INT64_MAX = np.iinfo(np.int64).max
+NO_KEY = np.iinfo(np.int64).min  # Marks entries without an alignment key in frame_keys arrays
+MULTI_FRAME_EXTENSIONS = tuple(ARRAY_EXTENSIONS + VIDEO_EXTENSIONS)  # Files expand_frames expands
+
+
+class FileList:
+    """Compact, immutable pane file list: directory paths plus basenames
+
+    Entries are rebuilt on access from the directory of each entry and its
+    basename, so the long shared prefix is stored once per directory and the
+    basename strings are the ones of the directory listing they came from.
+    `frames` holds the frame index of FrameRef entries (-1 for plain files),
+    or is None when there are none. Indexing, len() and iteration behave like
+    the list of paths/FrameRefs it replaces. `frame_keys` caches the alignment
+    keys of the entries per key regex (see alignment.pane_frame_keys).
+    """
+
+    __slots__ = ("directories", "dir_ids", "names", "frames", "frame_keys")
+
+    def __init__(self, directories=(), dir_ids=None, names=(), frames=None, frame_keys=None):
+        self.directories = list(directories)
+        self.dir_ids = np.zeros(len(names), dtype=np.int32) if dir_ids is None else dir_ids
+        self.names = list(names)
+        self.frames = frames
+        self.frame_keys = {} if frame_keys is None else frame_keys
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Build a FileList from a list of paths and FrameRefs"""
+        directories = {}
+        dir_ids = np.empty(len(entries), dtype=np.int32)
+        names = []
+        frames = None
+        for i, entry in enumerate(entries):
+            if isinstance(entry, FrameRef):
+                if frames is None:
+                    frames = np.full(len(entries), -1, dtype=np.int32)
+                frames[i] = entry.index
+                entry = entry.path
+            directory, name = os.path.split(entry)
+            dir_ids[i] = directories.setdefault(directory, len(directories))
+            names.append(name)
+        return cls(directories, dir_ids, names, frames)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        path = os.path.join(self.directories[self.dir_ids[i]], self.names[i])
+        if self.frames is not None and self.frames[i] >= 0:
+            return FrameRef(path, int(self.frames[i]))
+        return path
+
+    def __iter__(self):
+        for i in range(len(self.names)):
+            yield self[i]
+
+    def __repr__(self):
+        return f"<FileList of {len(self)} entries in {len(self.directories)} directories>"
+
+
+def expand_file_list(files):
+    """expand_frames for a FileList, returned as is when it has no possibly multi-frame files"""
+    if not any(name.lower().endswith(MULTI_FRAME_EXTENSIONS) for name in files.names):
+        return files
+    return FileList.from_entries(expand_frames(list(files)))
+
+
+def sort_key_array(keys):
+    """Pack natural sort keys (tuples of ints) into a -1 padded int64 array, one row per key
+
+    Padding with -1 sorts shorter keys first, as tuple comparison does.
+    Numbers beyond int64 are clamped.
+    """
+    width = max(map(len, keys), default=0)
+    array = np.full((len(keys), width), -1, dtype=np.int64)
+    for row, key in enumerate(keys):
+        try:
+            array[row, : len(key)] = key
+        except OverflowError:
+            array[row, : len(key)] = [min(number, INT64_MAX) for number in key]
+    return array
+
+
+def last_numbers(keys):
+    """Return the last number of each row of a sort key array, NO_KEY for rows without numbers"""
+    if keys.shape[1] == 0:
+        return np.full(len(keys), NO_KEY, dtype=np.int64)
+    counts = (keys >= 0).sum(axis=1)
+    return np.where(counts > 0, keys[np.arange(len(keys)), np.maximum(counts - 1, 0)], NO_KEY)
+
+
+def natural_order(key_arrays):
+    """Return the stable order of rows of several sort key arrays, concatenated"""
+    width = max((keys.shape[1] for keys in key_arrays), default=0)
+    rows = np.full((sum(len(keys) for keys in key_arrays), width), -1, dtype=np.int64)
+    start = 0
+    for keys in key_arrays:
+        rows[start : start + len(keys), : keys.shape[1]] = keys
+        start += len(keys)
+    # lexsort sorts by its last key first, so pass the columns right to left
+    return np.lexsort(rows.T[::-1]) if width else np.arange(len(rows))
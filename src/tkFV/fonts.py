@@ -0,0 +1,44 @@
+import os
+
+from PIL import ImageFont
+
+
+# Font files tried in order; the first one that loads is used for all pane text
+FONT_CANDIDATES = ["arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf"]
+
+
+class FontRegistry:
+    """Resolves the font used for pane text once and hands out cached instances per size
+
+    The font can be configured with the `font` argument or the TKFV_FONT
+    environment variable (a font file name or path); the candidates in
+    FONT_CANDIDATES are tried after it. If none loads, PIL's default font is used.
+    """
+
+    def __init__(self, font=None, candidates=None):
+        self.candidates = list(candidates if candidates is not None else FONT_CANDIDATES)
+        for preferred in (os.getenv("TKFV_FONT"), font):
+            if preferred:
+                self.candidates.insert(0, preferred)
+
+        self.fonts = {}
+        self.font_path = self.resolve()
+
+    def resolve(self):
+        for candidate in self.candidates:
+            try:
+                ImageFont.truetype(candidate, 12)
+                return candidate
+            except OSError:
+                continue
+        return None
+
+    def get(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            if self.font_path is not None:
+                font = ImageFont.truetype(self.font_path, size)
+            else:
+                font = ImageFont.load_default()
+            self.fonts[size] = font
+        return font
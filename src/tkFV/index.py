@@ -0,0 +1,245 @@
+import os
+import re
+import glob
+import time
+import fnmatch
+import itertools
+import threading
+
+import numpy as np
+
+from .config import extract_numbers, resolve_pattern
+from .filelist import FileList, expand_file_list, last_numbers, natural_order, sort_key_array
+
+
+SCAN_PROGRESS_INTERVAL = 0.2  # Seconds between progress reports of a running scan
+
+
+class ScanCancelled(Exception):
+    """Raised by DirectoryIndex.match when the ScanJob it runs for was cancelled"""
+
+
+class ScanJob:
+    """Progress reporting and cancellation of one pattern match running on another thread
+
+    `progress`, if given, is called from the scanning thread with the number
+    of directories and entries listed so far, at most every `interval` seconds.
+    cancel() may be called from any thread; the scan stops at the next
+    directory it visits.
+    """
+
+    def __init__(self, progress=None, interval=SCAN_PROGRESS_INTERVAL):
+        self.progress = progress
+        self.interval = interval
+        self.cancelled = threading.Event()
+        self.directories = 0
+        self.entries = 0
+        self.last_report = time.monotonic()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise ScanCancelled()
+
+    def advance(self, directories=0, entries=0):
+        self.check()
+        self.directories += directories
+        self.entries += entries
+
+        now = time.monotonic()
+        if self.progress is not None and now - self.last_report >= self.interval:
+            self.last_report = now
+            self.progress(self.directories, self.entries)
+
+
+class DirectoryListing:
+    def __init__(self, mtime, names, subdirs, version, previous=None):
+        self.mtime = mtime
+        self.names = names
+        self.subdirs = subdirs
+        self.version = version
+        self.keys = None  # Natural sort key array, one row per name, see sort_keys()
+        self.previous = previous  # Listing this one replaced, whose keys are reused
+
+    def sort_keys(self):
+        """Return the natural sort keys of all names, computed once per directory entry
+
+        After a re-listing only the names that were not in the previous
+        listing of the directory are parsed again.
+        """
+        if self.keys is not None:
+            return self.keys
+
+        previous, self.previous = self.previous, None
+        if previous is None or previous.keys is None:
+            self.keys = sort_key_array([extract_numbers(name) for name in self.names])
+            return self.keys
+
+        previous_rows = {name: row for row, name in enumerate(previous.names)}
+        rows = np.array([previous_rows.get(name, -1) for name in self.names], dtype=np.intp)
+        new = rows < 0
+        fresh = sort_key_array([extract_numbers(self.names[i]) for i in np.flatnonzero(new)])
+        width = max(previous.keys.shape[1], fresh.shape[1])
+        self.keys = np.full((len(self.names), width), -1, dtype=np.int64)
+        self.keys[~new, : previous.keys.shape[1]] = previous.keys[rows[~new]]
+        self.keys[new, : fresh.shape[1]] = fresh
+        return self.keys
+
+
+def filter_names(names, part):
+    """Match directory entry names against one glob path component, like glob.glob does"""
+    if not glob.has_magic(part):
+        return [part] if part in names else []
+    if not part.startswith("."):
+        # Hidden entries only match patterns that start with a dot
+        names = [name for name in names if not name.startswith(".")]
+    return fnmatch.filter(names, part)
+
+
+def filter_rows(names, part):
+    """Like filter_names, but return the positions of the matching names"""
+    if not glob.has_magic(part):
+        return [names.index(part)] if part in names else []
+    match = re.compile(fnmatch.translate(os.path.normcase(part))).match
+    hidden = part.startswith(".")
+    return [
+        row
+        for row, name in enumerate(names)
+        if (hidden or not name.startswith(".")) and match(os.path.normcase(name))
+    ]
+
+
+class DirectoryIndex:
+    """In-memory index of the directories below a base directory that patterns refer to
+
+    Each directory is listed once and only re-listed when its mtime changes, so
+    matching a pattern while it is being typed never goes back to the file
+    system for directories that have already been seen. Not thread safe: use
+    it from a single worker thread.
+    """
+
+    def __init__(self, base_directory):
+        self.base_directory = base_directory
+        self.listings = {}  # Relative directory -> DirectoryListing
+        self.matches = {}  # Pattern -> (listing versions, sorted FileList)
+        self.versions = itertools.count(1)
+
+    def listing(self, rel_dir, job=None):
+        listing = self.listings.get(rel_dir)
+        if listing is None:
+            listing = self.scan(rel_dir)
+            if job is not None:
+                job.advance(1, len(listing.names))
+        elif job is not None:
+            job.check()
+        return listing
+
+    def scan(self, rel_dir):
+        path = os.path.join(self.base_directory, rel_dir)
+        names = []
+        subdirs = set()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    names.append(entry.name)
+                    if entry.is_dir():
+                        subdirs.add(entry.name)
+        except OSError:
+            mtime = None
+
+        previous = self.listings.get(rel_dir)
+        if previous is not None and previous.keys is None:
+            previous = None  # Nothing to reuse, and keeps listings from chaining
+        listing = DirectoryListing(mtime, names, subdirs, next(self.versions), previous)
+        self.listings[rel_dir] = listing
+        return listing
+
+    def refresh(self):
+        """Re-list the indexed directories whose mtime changed
+
+        Returns the number of directories that were re-listed.
+        """
+        changed = 0
+        for rel_dir, listing in list(self.listings.items()):
+            try:
+                mtime = os.stat(os.path.join(self.base_directory, rel_dir)).st_mtime_ns
+            except OSError:
+                mtime = None
+
+            if mtime != listing.mtime:
+                self.scan(rel_dir)
+                changed += 1
+
+        return changed
+
+    def match(self, pattern, job=None):
+        """Return the files matching a pattern relative to the base directory, in natural order
+
+        With a ScanJob, progress is reported per listed directory and
+        ScanCancelled is raised once the job is cancelled.
+        """
+        parts = os.path.normpath(pattern).split(os.sep)
+        if os.path.isabs(pattern) or ".." in parts or not parts[-1] or pattern.endswith(os.sep):
+            # Patterns escaping the base directory are not indexed
+            return resolve_pattern(self.base_directory, pattern)
+        if parts[0] == ".":
+            parts = parts[1:]
+
+        # Walk the directory components, expanding wildcards against indexed subdirectories
+        dirs = [""]
+        for part in parts[:-1]:
+            if not glob.has_magic(part):
+                dirs = [os.path.join(rel_dir, part) for rel_dir in dirs]
+                continue
+            dirs = [
+                os.path.join(rel_dir, name)
+                for rel_dir in dirs
+                for name in filter_names(self.listing(rel_dir, job).subdirs, part)
+            ]
+
+        listings = [(rel_dir, self.listing(rel_dir, job)) for rel_dir in dirs]
+        versions = tuple(listing.version for _, listing in listings)
+
+        cached = self.matches.get(pattern)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+
+        files = self.sorted_matches(listings, parts[-1])
+        if job is not None:
+            job.check()
+        files = expand_file_list(files)
+
+        self.matches[pattern] = (versions, files)
+        return files
+
+    def sorted_matches(self, listings, part):
+        """Return the names matching `part` in the given listings as a FileList in natural order
+
+        Entries sort by the numbers of their relative directory followed by
+        those of their name, which orders them like the numbers of the full
+        path would.
+        """
+        directories, dir_ids, names, key_arrays, frame_keys = [], [], [], [], []
+        for rel_dir, listing in listings:
+            rows = np.array(filter_rows(listing.names, part), dtype=np.intp)
+            if len(rows) == 0:
+                continue
+            dir_key = sort_key_array([extract_numbers(rel_dir)])
+            name_keys = listing.sort_keys()[rows]
+            key_arrays.append(np.hstack((np.repeat(dir_key, len(rows), axis=0), name_keys)))
+            # The default alignment key is the last number of the name, see frame_key
+            frame_keys.append(last_numbers(name_keys))
+            dir_ids.append(np.full(len(rows), len(directories), dtype=np.int32))
+            directories.append(os.path.join(self.base_directory, rel_dir))
+            names.extend(listing.names[row] for row in rows)
+
+        if not names:
+            return FileList()
+        order = natural_order(key_arrays)
+        return FileList(
+            directories, np.concatenate(dir_ids)[order], [names[row] for row in order],
+            frame_keys={None: np.concatenate(frame_keys)[order]},
+        )
@@ -0,0 +1,305 @@
+import os
+import json
+import shutil
+import itertools
+import threading
+
+from .encoders import ANIMATED_EXTENSIONS, ImageSequenceEncoder, encode_frames, join_videos
+from .encoders import make_encoder
+from .export import ExportProgress, render_stream
+
+
+SEGMENT_FRAMES = 240  # Frames per resumable segment of an export job
+SEGMENT_DIRECTORY_SUFFIX = ".segments"  # Appended to the output path for a job's work directory
+JOB_STATE_FILE = "job.json"
+PAUSE_POLL_SECONDS = 0.2  # How often a paused job checks whether it was cancelled
+JOB_ACTIVE_STATES = ["running", "paused"]
+
+
+class ExportCancelled(Exception):
+    """Raised inside a running ExportJob once it was cancelled"""
+
+
+def segment_directory(output_path):
+    return output_path + SEGMENT_DIRECTORY_SUFFIX
+
+
+def panes_fingerprint(panes, timeline):
+    """Summarize what the panes show, so a job is only resumed for the same content"""
+    summary = {}
+    for i, config in sorted(panes.items()):
+        files = config.files
+        ends = [str(files[0]), str(files[-1])] if len(files) else []
+        summary[str(i)] = [config.pattern, config.enabled, config.follow, len(files)] + ends
+    if timeline is not None:
+        summary["timeline"] = [timeline.mode, len(timeline)]
+    return summary
+
+
+class ExportJob:
+    """An export rendered in segments, so that it can be paused, cancelled and resumed
+
+    Videos are written segment by segment into a work directory next to the
+    output (see segment_directory). A segment is renamed into place once it
+    is complete, and at the end all segments are joined into the output.
+    Running a job with the same settings again, even after the process was
+    killed, skips the segments that are already complete. Image sequences are
+    written in place and only their finished segments are recorded. GIF and
+    WebP are encoded in one go and always start over.
+
+    `state` is one of "queued", "running", "paused", "done", "failed" or
+    "cancelled". `on_change`, if set, is called with the job from the
+    thread running it whenever its state or progress message changes.
+    """
+
+    def __init__(self, compositor, layout, panes, timeline, frame_indices, width, height, fps,
+                 output_path, workers=1, encoder="opencv", encoder_options=None,
+                 segment_frames=SEGMENT_FRAMES):
+        self.compositor = compositor
+        self.layout = layout
+        self.panes = panes
+        self.timeline = timeline
+        self.frame_indices = frame_indices
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.output_path = output_path
+        self.workers = workers
+        self.encoder = encoder
+        self.encoder_options = encoder_options or {}
+        self.segment_frames = segment_frames
+
+        self.state = "queued"
+        self.message = "Queued"
+        self.error = None
+        self.on_change = None
+        self.unpaused = threading.Event()
+        self.unpaused.set()
+        self.cancelled = threading.Event()
+
+    def set_state(self, state, message):
+        self.state = state
+        self.message = message
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def pause(self):
+        if self.state == "running":
+            self.unpaused.clear()
+            self.set_state("paused", f"Paused: {self.message}")
+
+    def resume(self):
+        if self.state == "paused":
+            self.unpaused.set()
+            self.set_state("running", self.message.replace("Paused: ", "", 1))
+
+    def cancel(self):
+        self.cancelled.set()
+        self.unpaused.set()
+        if self.state == "queued":
+            self.set_state("cancelled", "Cancelled")
+
+    def checkpoint(self, frames):
+        """Pass frames through, blocking while paused and stopping once cancelled"""
+        for frame in frames:
+            while not self.unpaused.wait(PAUSE_POLL_SECONDS):
+                pass
+            if self.cancelled.is_set():
+                raise ExportCancelled()
+            yield frame
+
+    def params(self):
+        """Return the settings a resumed run must match, as stored in the job state file"""
+        indices = self.frame_indices
+        if isinstance(indices, range):
+            indices = [indices.start, indices.stop, indices.step]
+        params = {
+            "output": os.path.abspath(self.output_path),
+            "layout": self.layout,
+            "frames": list(indices),
+            "size": [self.width, self.height],
+            "fps": self.fps,
+            "encoder": self.encoder,
+            "encoder_options": self.encoder_options,
+            "segment_frames": self.segment_frames,
+            "backend": self.compositor.backend,
+            "content": panes_fingerprint(self.panes, self.timeline),
+        }
+        # Compare in the form it is read back in, with tuples turned into lists
+        return json.loads(json.dumps(params))
+
+    def load_done_segments(self, directory):
+        """Return the indices of the segments a previous run of this job completed"""
+        try:
+            with open(os.path.join(directory, JOB_STATE_FILE)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = None
+        if state is not None and state.get("params") == self.params():
+            return set(state.get("segments", []))
+
+        # Segments of an export with other settings are of no use
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        return set()
+
+    def save_done_segments(self, directory, done):
+        path = os.path.join(directory, JOB_STATE_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"params": self.params(), "segments": sorted(done)}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def segment_path(self, directory, segment):
+        ext = os.path.splitext(self.output_path)[1]
+        return os.path.join(directory, f"segment_{segment:05d}{ext}")
+
+    def run(self):
+        """Render the job on the calling thread; errors end up in `state` and `error`"""
+        if self.cancelled.is_set():
+            self.set_state("cancelled", "Cancelled")
+            return
+        self.set_state("running", "Starting")
+        try:
+            self.export()
+            self.set_state("done", f"Exported to {self.output_path}")
+        except ExportCancelled:
+            self.set_state("cancelled", "Cancelled, finished segments are kept for resuming")
+        except Exception as e:
+            self.error = e
+            self.set_state("failed", f"Failed: {str(e)}")
+
+    def export(self):
+        indices = list(self.frame_indices)
+        sequence = "%" in self.output_path
+        animated = os.path.splitext(self.output_path)[1].lower() in ANIMATED_EXTENSIONS
+        segment_frames = len(indices) if animated else self.segment_frames
+        segments = [
+            indices[start : start + segment_frames]
+            for start in range(0, len(indices), segment_frames)
+        ]
+
+        directory = segment_directory(self.output_path)
+        os.makedirs(directory, exist_ok=True)
+        done = set() if animated else self.load_done_segments(directory)
+        resumed = sum(len(segments[k]) for k in done if k < len(segments))
+        pending = [k for k in range(len(segments)) if k not in done]
+
+        def progress(message):
+            if self.state == "running":
+                self.set_state("running", message)
+
+        tracker = ExportProgress(len(indices), progress, resumed=resumed)
+        frames = self.checkpoint(
+            render_stream(
+                self.compositor, self.layout, self.panes,
+                [frame for k in pending for frame in segments[k]], self.width, self.height,
+                self.workers, self.timeline,
+            )
+        )
+        try:
+            for k in pending:
+                if sequence:
+                    start_index = k * segment_frames
+                    encoder = ImageSequenceEncoder(self.output_path, start_index=start_index)
+                    partial_path = None
+                elif animated:
+                    encoder = make_encoder(self.output_path)
+                    partial_path = None
+                else:
+                    # The container is picked from the extension, so it stays at the end
+                    root, ext = os.path.splitext(self.segment_path(directory, k))
+                    partial_path = f"{root}.partial{ext}"
+                    encoder = make_encoder(partial_path, self.encoder, **self.encoder_options)
+
+                base = resumed + sum(len(segments[j]) for j in pending[: pending.index(k)])
+                encoder.open(self.width, self.height, self.fps)
+                try:
+                    encode_frames(
+                        encoder, itertools.islice(frames, len(segments[k])),
+                        lambda n: tracker.update(base + n),
+                    )
+                finally:
+                    encoder.close()
+
+                if partial_path is not None:
+                    os.replace(partial_path, self.segment_path(directory, k))
+                done.add(k)
+                if not animated:
+                    self.save_done_segments(directory, done)
+        finally:
+            frames.close()
+
+        if not sequence and not animated:
+            self.set_state("running", "Joining segments")
+            paths = [self.segment_path(directory, k) for k in range(len(segments))]
+            if len(paths) == 1:
+                os.replace(paths[0], self.output_path)
+            else:
+                join_videos(paths, self.output_path)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class ExportJobManager:
+    """Runs queued export jobs in order, as many at a time as fit a CPU budget
+
+    A job takes as many CPUs as it has render workers, for as long as it is
+    running or paused. The oldest queued job starts once it fits next to the
+    running ones; a job larger than the whole budget runs on its own.
+    `on_change` is called with a job whenever it changes, from the job's
+    thread.
+    """
+
+    def __init__(self, cpu_budget=None, on_change=None):
+        self.cpu_budget = cpu_budget or os.cpu_count() or 1
+        self.on_change = on_change
+        self.jobs = []
+        self.threads = {}
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        job.on_change = self.job_changed
+        with self.lock:
+            self.jobs.append(job)
+        self.job_changed(job)
+        self.schedule()
+        return job
+
+    def schedule(self):
+        with self.lock:
+            used = sum(job.workers for job in self.jobs if job.state in JOB_ACTIVE_STATES)
+            for job in self.jobs:
+                if job.state != "queued" or job in self.threads:
+                    continue
+                if used and used + job.workers > self.cpu_budget:
+                    break  # Keep the queue order, later jobs wait too
+                used += job.workers
+                thread = threading.Thread(
+                    target=self.run_job, args=(job,), name="tkFV-export", daemon=True
+                )
+                self.threads[job] = thread
+                # Counted as running from now on, before the thread gets to it
+                job.state = "running"
+                thread.start()
+
+    def run_job(self, job):
+        job.run()
+        with self.lock:
+            self.threads.pop(job, None)
+        self.schedule()
+
+    def job_changed(self, job):
+        if self.on_change is not None:
+            self.on_change(job)
+
+    def remove_finished(self):
+        with self.lock:
+            self.jobs = [job for job in self.jobs if job.state in ["queued"] + JOB_ACTIVE_STATES]
+
+    def active_jobs(self):
+        with self.lock:
+            return [job for job in self.jobs if job.state in ["queued"] + JOB_ACTIVE_STATES]
+
+    def cancel_all(self):
+        """Cancel every queued and running job, without waiting for them to stop"""
+        for job in self.active_jobs():
+            job.cancel()
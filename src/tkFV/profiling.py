@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+TRACE_MAX_EVENTS = 200000  # Most recent stage timings kept for a trace, older ones are dropped
+
+
+class Profiler:
+    """Per-stage wall clock timings of rendering, collected from any thread
+
+    Code wraps its stages in `with profiler.stage("decode"):`. While the
+    profiler is disabled a stage costs a single attribute check. While it is
+    enabled every stage is recorded as a Chrome trace "complete" event, so a
+    session can be saved with save_trace() and opened in chrome://tracing or
+    Perfetto. Per-stage totals are kept for summaries.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.events = deque(maxlen=TRACE_MAX_EVENTS)
+        self.totals = {}  # Stage name -> [count, seconds]
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **args):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), args)
+
+    def record(self, name, start, end, args=None):
+        """Record a stage that ran from `start` to `end` (time.perf_counter() values)"""
+        if not self.enabled:
+            return
+
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": (start - self.origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+
+        with self.lock:
+            self.events.append(event)
+            total = self.totals.setdefault(name, [0, 0.0])
+            total[0] += 1
+            total[1] += end - start
+
+    def summary(self):
+        """Return {stage: (count, mean milliseconds)} of the stages recorded so far"""
+        with self.lock:
+            return {
+                name: (count, seconds * 1000 / count)
+                for name, (count, seconds) in self.totals.items()
+            }
+
+    def clear(self):
+        with self.lock:
+            self.events.clear()
+            self.totals.clear()
+
+    def save_trace(self, output_path):
+        """Write the recorded stages as a Chrome trace JSON file"""
+        with self.lock:
+            events = list(self.events)
+
+        # Name the threads so the timeline reads "tkFV-decode_0" instead of raw thread ids
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": names.get(tid, str(tid))},
+            }
+            for pid, tid in sorted({(event["pid"], event["tid"]) for event in events})
+        ]
+
+        with open(output_path, "w") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+# Shared by the GUI, the compositor, the decode cache and the export path of a process
+profiler = Profiler()
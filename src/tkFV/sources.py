@@ -0,0 +1,555 @@
+import os
+import bisect
+import zipfile
+import threading
+from collections import OrderedDict, namedtuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".bmp", ".gif"]
+ARRAY_EXTENSIONS = [".npy", ".npz"]
+VIDEO_EXTENSIONS = [".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v"]
+
+NPZ_ARRAYS_MAX = 4  # Number of decompressed .npz arrays kept for reading their frames
+VIDEO_READERS_MAX = 16  # Number of video files kept open for random access
+VIDEO_GRAB_WINDOW = 30  # Without a keyframe index, decode forward rather than seek up to this far
+TEXT_FILES_MAX = 32  # Number of text files kept open for head/tail reads
+TEXT_BLOCK_SIZE = 64 * 1024  # Block size of backwards reads when tailing text files
+TEXT_HEAD_CHARS = 800  # Characters shown from the start of a text file
+
+# OpenCV decode modes that scale by 1/8, 1/4 or 1/2 while decoding, largest reduction first
+CV2_REDUCED_MODES = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+# Anchor colors of the viridis colormap, interpolated into a 256 entry lookup table
+VIRIDIS_ANCHORS = np.array(
+    [
+        [68, 1, 84],
+        [72, 40, 120],
+        [62, 74, 137],
+        [49, 104, 142],
+        [38, 130, 142],
+        [31, 158, 137],
+        [53, 183, 121],
+        [109, 205, 89],
+        [180, 222, 44],
+        [253, 231, 37],
+    ],
+    dtype=np.float32,
+)
+VIRIDIS_LUT = np.stack(
+    [
+        np.interp(np.linspace(0, 1, 256), np.linspace(0, 1, len(VIRIDIS_ANCHORS)), channel)
+        for channel in VIRIDIS_ANCHORS.T
+    ],
+    axis=1,
+).astype(np.uint8)
+
+
+# A single frame inside a multi-frame file: a slice of a (T, H, W[, C]) .npy stack or a video frame
+FrameRef = namedtuple("FrameRef", ["path", "index"])
+
+
+def frame_path(entry):
+    """Return the file path of a pane file list entry (a path or a FrameRef)"""
+    return entry.path if isinstance(entry, FrameRef) else entry
+
+
+def frame_index(entry):
+    """Return the frame index inside the file of a pane file list entry, or None"""
+    return entry.index if isinstance(entry, FrameRef) else None
+
+
+def frame_name(entry):
+    """Return a short display name for a pane file list entry"""
+    name = os.path.basename(frame_path(entry))
+    index = frame_index(entry)
+    return name if index is None else f"{name}[{index}]"
+
+
+def frame_extension(entry):
+    return os.path.splitext(frame_path(entry))[1].lower()
+
+
+def is_decodable(entry):
+    """Return whether an entry is drawn from decoded pixels (and can be cached/prefetched)"""
+    return frame_extension(entry) in IMAGE_EXTENSIONS + ARRAY_EXTENSIONS + VIDEO_EXTENSIONS
+
+
+def fit_size(img_width, img_height, box_width, box_height):
+    """Return the aspect ratio preserving size of an image fitted into a box"""
+    img_ratio = img_width / img_height
+    box_ratio = box_width / box_height
+
+    if img_ratio > box_ratio:
+        # Image is wider than the box
+        return box_width, max(1, int(box_width / img_ratio))
+    # Image is taller than the box
+    return max(1, int(box_height * img_ratio)), box_height
+
+
+def load_fitted_image(file_path, box_width, box_height):
+    """Decode an image file and resize it to fit into the given box
+
+    Work is kept proportional to the box rather than the source: JPEGs are
+    decoded at a reduced DCT scale via draft mode, and other formats are
+    shrunk by an integer factor with Image.reduce before the final resample.
+    Returns a tuple of (resized RGB image, original size).
+    """
+    with Image.open(file_path) as img:
+        original_size = img.size
+        new_width, new_height = fit_size(img.width, img.height, box_width, box_height)
+
+        # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 while keeping at least the target size
+        if img.format == "JPEG":
+            img.draft("RGB", (new_width, new_height))
+
+        # Convert modes that Image.reduce does not support (palette, bilevel, 16 bit, ...)
+        if img.mode not in ("L", "RGB", "RGBA"):
+            img = img.convert("RGB")
+
+        factor = min(img.width // new_width, img.height // new_height)
+        if factor >= 2:
+            img = img.reduce(factor)
+
+        # Convert to RGB if needed (handles RGBA, grayscale, etc.)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
+        return img.resize((new_width, new_height), Image.BILINEAR), original_size
+
+
+def load_fitted_image_array(file_path, box_width, box_height):
+    """Decode an image file with OpenCV into an RGB array that fits into the given box
+
+    Counterpart of load_fitted_image for the OpenCV compositor. Large images
+    are reduced by 1/2, 1/4 or 1/8 while decoding (IMREAD_REDUCED_COLOR_*),
+    and the remaining downscale uses INTER_AREA. Formats OpenCV cannot read,
+    such as GIF, are decoded with PIL instead.
+    Returns a tuple of (resized RGB array, original size).
+    """
+    # Only parses the header, for the original size
+    with Image.open(file_path) as img:
+        img_width, img_height = img.size
+        img_format = img.format
+
+    frame = None
+    new_width, new_height = fit_size(img_width, img_height, box_width, box_height)
+    if img_format != "GIF":
+        flags = cv2.IMREAD_COLOR
+        for factor, mode in CV2_REDUCED_MODES:
+            if img_width // factor >= new_width and img_height // factor >= new_height:
+                flags = mode
+                break
+        # PIL does not apply EXIF orientation either, keep both backends identical
+        frame = cv2.imread(file_path, flags | cv2.IMREAD_IGNORE_ORIENTATION)
+
+    if frame is None:
+        img, original_size = load_fitted_image(file_path, box_width, box_height)
+        return np.asarray(img), original_size
+
+    interpolation = cv2.INTER_AREA if frame.shape[1] > new_width else cv2.INTER_LINEAR
+    resized = cv2.resize(frame, (new_width, new_height), interpolation=interpolation)
+    return cv2.cvtColor(resized, cv2.COLOR_BGR2RGB), (img_width, img_height)
+
+
+npz_arrays = OrderedDict()  # (path, mtime) -> first array of a .npz archive, most recent last
+npz_arrays_lock = threading.Lock()
+
+
+def open_array(file_path):
+    """Memory-map a .npy file, or load the first array of a .npz archive
+
+    Archives cannot be memory-mapped, so the last few loaded are kept for the
+    other frames of .npz stacks.
+    """
+    if not file_path.lower().endswith(".npz"):
+        return np.load(file_path, mmap_mode="r")
+
+    key = (file_path, os.path.getmtime(file_path))
+    with npz_arrays_lock:
+        data = npz_arrays.get(key)
+        if data is not None:
+            npz_arrays.move_to_end(key)
+            return data
+
+    with np.load(file_path) as archive:
+        data = archive[archive.files[0]]
+    with npz_arrays_lock:
+        npz_arrays[key] = data
+        while len(npz_arrays) > NPZ_ARRAYS_MAX:
+            npz_arrays.popitem(last=False)
+    return data
+
+
+def read_npy_shape(f):
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)[0]
+    return np.lib.format.read_array_header_2_0(f)[0]
+
+
+def array_shape(file_path):
+    """Return the shape of a .npy file or of the first array of a .npz archive
+
+    Only the .npy header is read, nothing is loaded or decompressed.
+    """
+    if file_path.lower().endswith(".npz"):
+        with zipfile.ZipFile(file_path) as archive:
+            with archive.open(archive.namelist()[0]) as f:
+                return read_npy_shape(f)
+    with open(file_path, "rb") as f:
+        return read_npy_shape(f)
+
+
+def is_stack_shape(shape):
+    # (T, H, W, C) stacks, and (T, H, W) stacks that do not look like a single (H, W, C) image
+    return len(shape) == 4 or (len(shape) == 3 and shape[-1] not in (1, 3, 4))
+
+
+def expand_frames(files):
+    """Replace each multi-frame file in a sorted file list by one FrameRef per frame
+
+    Videos are expanded to their frame count and .npy/.npz stacks to their
+    first dimension; only container and .npy headers are read.
+    """
+    expanded = []
+    for path in files:
+        ext = frame_extension(path)
+        if ext in ARRAY_EXTENSIONS:
+            try:
+                shape = array_shape(path)
+            except (OSError, ValueError, IndexError, zipfile.BadZipFile):
+                shape = ()
+            if is_stack_shape(shape):
+                expanded.extend(FrameRef(path, i) for i in range(shape[0]))
+                continue
+        elif ext in VIDEO_EXTENSIONS:
+            capture = cv2.VideoCapture(path)
+            frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) if capture.isOpened() else 0
+            capture.release()
+            expanded.extend(FrameRef(path, i) for i in range(frame_count))
+            continue
+        expanded.append(path)
+    return expanded
+
+
+def array_to_rgb(frame):
+    """Convert a 2D or (H, W, C) array into an RGB uint8 array with vectorized NumPy
+
+    uint8 data is shown as is (grayscale or color). Any other single channel
+    data is normalised to its finite min/max and mapped through viridis; other
+    multi-channel data is normalised to 0-255.
+    """
+    if frame.ndim == 3 and frame.shape[-1] == 1:
+        frame = frame[..., 0]
+    if frame.ndim == 3:
+        frame = frame[..., :3]
+
+    if frame.dtype == np.uint8:
+        if frame.ndim == 2:
+            return np.repeat(frame[..., None], 3, axis=2)
+        if frame.shape[-1] < 3:
+            frame = np.concatenate([frame, frame[..., :1]], axis=2)[..., :3]
+        return np.ascontiguousarray(frame)
+
+    data = np.asarray(frame, dtype=np.float32)
+    finite = np.isfinite(data)
+    if finite.any():
+        low, high = data[finite].min(), data[finite].max()
+    else:
+        low, high = 0.0, 0.0
+    scale = 255.0 / (high - low) if high > low else 0.0
+    levels = np.clip((np.where(finite, data, low) - low) * scale, 0, 255).astype(np.uint8)
+
+    if levels.ndim == 2:
+        return VIRIDIS_LUT[levels]
+    if levels.shape[-1] < 3:
+        levels = np.concatenate([levels, levels[..., :1]], axis=2)[..., :3]
+    return levels
+
+
+def load_fitted_array(file_path, index, box_width, box_height):
+    """Load one frame of a .npy/.npz file and resize it to fit into the given box
+
+    The source is memory-mapped and subsampled with strides before
+    conversion, so only the pages of the rows needed for the pane are read.
+    Returns a tuple of (resized RGB image, original size).
+    """
+    data = open_array(file_path)
+    frame = data[index] if index is not None else data
+    if frame.ndim not in (2, 3):
+        raise ValueError(f"Cannot display array of shape {frame.shape}")
+
+    img_height, img_width = frame.shape[:2]
+    new_width, new_height = fit_size(img_width, img_height, box_width, box_height)
+
+    step = max(1, min(img_width // new_width, img_height // new_height))
+    rgb = array_to_rgb(frame[::step, ::step])
+
+    img = Image.fromarray(rgb)
+    return img.resize((new_width, new_height), Image.BILINEAR), (img_width, img_height)
+
+
+def load_fitted_array_array(file_path, index, box_width, box_height):
+    """Like load_fitted_array, but resized with OpenCV and returned as an RGB array"""
+    data = open_array(file_path)
+    frame = data[index] if index is not None else data
+    if frame.ndim not in (2, 3):
+        raise ValueError(f"Cannot display array of shape {frame.shape}")
+
+    img_height, img_width = frame.shape[:2]
+    new_width, new_height = fit_size(img_width, img_height, box_width, box_height)
+
+    step = max(1, min(img_width // new_width, img_height // new_height))
+    rgb = array_to_rgb(frame[::step, ::step])
+    resized = cv2.resize(rgb, (new_width, new_height), interpolation=cv2.INTER_AREA)
+    return resized, (img_width, img_height)
+
+
+class VideoReader:
+    """Random access to the frames of a video file through one open cv2.VideoCapture
+
+    A keyframe index is built once by reading the packets without decoding
+    them. A frame is then reached by seeking to the closest keyframe at or
+    before it and decoding forward, unless the decoder is already between
+    that keyframe and the frame, so sequential playback never seeks.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.keyframes = self.build_keyframe_index()
+        self.capture = cv2.VideoCapture(file_path)
+        self.position = 0  # Index of the frame the next read returns, None if unknown
+        if not self.capture.isOpened():
+            raise IOError(f"Could not open video {file_path}")
+
+    def build_keyframe_index(self):
+        capture = cv2.VideoCapture(self.file_path)
+        keyframes = []
+        try:
+            # Raw mode: grab() only demuxes packets, nothing is decoded
+            if not capture.isOpened() or not capture.set(cv2.CAP_PROP_FORMAT, -1):
+                return None
+            index = 0
+            while capture.grab():
+                if capture.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                    keyframes.append(index)
+                index += 1
+        finally:
+            capture.release()
+        return keyframes or None
+
+    def seek_start(self, index):
+        """Return the frame to seek to before decoding forward to `index`"""
+        if self.keyframes is None:
+            return index
+        return self.keyframes[max(0, bisect.bisect_right(self.keyframes, index) - 1)]
+
+    def read(self, index):
+        """Return frame `index` as a BGR array"""
+        with self.lock:
+            start = self.seek_start(index)
+            if self.position is None:
+                near = False
+            elif self.keyframes is None:
+                near = self.position <= index <= self.position + VIDEO_GRAB_WINDOW
+            else:
+                near = start <= self.position <= index
+
+            if not near:
+                self.capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+                self.position = start
+
+            # Decode (without converting) the frames in between
+            while self.position < index:
+                if not self.capture.grab():
+                    break
+                self.position += 1
+
+            ok, frame = self.capture.read()
+            if not ok:
+                # Force a fresh seek on the next request
+                self.position = None
+                raise IOError(f"Could not decode frame {index} of {self.file_path}")
+            self.position += 1
+            return frame
+
+    def size(self):
+        with self.lock:
+            width = self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)
+            height = self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        return int(width), int(height)
+
+    def release(self):
+        with self.lock:
+            self.capture.release()
+
+
+video_readers = OrderedDict()  # (path, mtime) -> VideoReader, most recently used last
+video_readers_lock = threading.Lock()
+
+
+def get_video_reader(file_path):
+    key = (file_path, os.path.getmtime(file_path))
+    with video_readers_lock:
+        reader = video_readers.get(key)
+        if reader is not None:
+            video_readers.move_to_end(key)
+            return reader
+
+    reader = VideoReader(file_path)
+    with video_readers_lock:
+        reader = video_readers.setdefault(key, reader)
+        while len(video_readers) > VIDEO_READERS_MAX:
+            _, old_reader = video_readers.popitem(last=False)
+            old_reader.release()
+    return reader
+
+
+def load_fitted_video_array(file_path, index, box_width, box_height):
+    """Decode one frame of a video file into an RGB array that fits into the given box"""
+    frame = get_video_reader(file_path).read(index or 0)
+    img_height, img_width = frame.shape[:2]
+    new_width, new_height = fit_size(img_width, img_height, box_width, box_height)
+
+    resized = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(resized, cv2.COLOR_BGR2RGB), (img_width, img_height)
+
+
+def load_fitted_video(file_path, index, box_width, box_height):
+    """Decode one frame of a video file and resize it to fit into the given box"""
+    rgb, original_size = load_fitted_video_array(file_path, index, box_width, box_height)
+    return Image.fromarray(rgb), original_size
+
+
+def load_fitted_frame(file_path, index, box_width, box_height):
+    """Decode frame `index` (None for single frame files) of a file to fit into the given box"""
+    ext = frame_extension(file_path)
+    if ext in ARRAY_EXTENSIONS:
+        return load_fitted_array(file_path, index, box_width, box_height)
+    if ext in VIDEO_EXTENSIONS:
+        return load_fitted_video(file_path, index, box_width, box_height)
+    return load_fitted_image(file_path, box_width, box_height)
+
+
+def load_fitted_frame_array(file_path, index, box_width, box_height):
+    """Like load_fitted_frame, but decodes with OpenCV and returns an RGB array"""
+    ext = frame_extension(file_path)
+    if ext in ARRAY_EXTENSIONS:
+        return load_fitted_array_array(file_path, index, box_width, box_height)
+    if ext in VIDEO_EXTENSIONS:
+        return load_fitted_video_array(file_path, index, box_width, box_height)
+    return load_fitted_image_array(file_path, box_width, box_height)
+
+
+def frame_size(file_path, index):
+    """Return the original (width, height) of a frame without decoding it"""
+    ext = frame_extension(file_path)
+    if ext in ARRAY_EXTENSIONS:
+        data = open_array(file_path)
+        frame = data[index] if index is not None else data
+        return frame.shape[1], frame.shape[0]
+    if ext in VIDEO_EXTENSIONS:
+        return get_video_reader(file_path).size()
+    # Only parses the header
+    with Image.open(file_path) as img:
+        return img.size
+
+
+class TextFile:
+    """Open handle on a text file that serves its head or its last lines without re-opening it
+
+    The tail is found with backwards block reads from the end of the file and
+    kept as raw bytes; when the file grows only the appended bytes are read,
+    which makes following a growing log cheap. A file replaced on disk (e.g.
+    by log rotation) is re-opened.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.handle = open(file_path, "rb")
+        self.inode = os.fstat(self.handle.fileno()).st_ino
+        self.tail_bytes = b""
+        self.tail_size = None  # File size the tail was read at, None if not read yet
+        self.tail_lines = 0
+
+    def stat(self):
+        """Return (size, mtime_ns) of the file, re-opening it if it was replaced"""
+        with self.lock:
+            stat = os.stat(self.file_path)
+            if stat.st_ino != self.inode:
+                self.handle.close()
+                self.handle = open(self.file_path, "rb")
+                self.inode = stat.st_ino
+                self.tail_size = None
+            return stat.st_size, stat.st_mtime_ns
+
+    def head(self, max_chars=TEXT_HEAD_CHARS):
+        with self.lock:
+            self.handle.seek(0)
+            # UTF-8 needs at most 4 bytes per character
+            data = self.handle.read(max_chars * 4)
+        return data.decode("utf-8", errors="ignore")[:max_chars]
+
+    def tail(self, max_lines):
+        """Return the last `max_lines` lines of the file"""
+        with self.lock:
+            size = os.fstat(self.handle.fileno()).st_size
+
+            grown = self.tail_size is not None and size >= self.tail_size
+            if grown and self.tail_lines >= max_lines:
+                # Append only what was written since the last read
+                self.handle.seek(self.tail_size)
+                self.tail_bytes += self.handle.read(size - self.tail_size)
+            else:
+                # Read blocks backwards from the end until enough lines are covered
+                self.tail_bytes = b""
+                pos = size
+                while pos > 0 and self.tail_bytes.count(b"\n") <= max_lines:
+                    block = min(TEXT_BLOCK_SIZE, pos)
+                    pos -= block
+                    self.handle.seek(pos)
+                    self.tail_bytes = self.handle.read(block) + self.tail_bytes
+
+            self.tail_size = size
+            self.tail_lines = max_lines
+
+            data = self.tail_bytes
+            body = data[:-1] if data.endswith(b"\n") else data
+            lines = body.split(b"\n")[-max_lines:] if max_lines > 0 and body else []
+
+            # Only keep the bytes of the lines still needed, including an unterminated last line
+            kept = sum(len(line) + 1 for line in lines) - 1 if lines else 0
+            self.tail_bytes = data[len(body) - kept :] if lines else b""
+            return [line.decode("utf-8", errors="ignore") for line in lines]
+
+    def close(self):
+        with self.lock:
+            self.handle.close()
+
+
+text_files = OrderedDict()  # Path -> TextFile, most recently used last
+text_files_lock = threading.Lock()
+
+
+def get_text_file(file_path):
+    with text_files_lock:
+        text_file = text_files.get(file_path)
+        if text_file is not None:
+            text_files.move_to_end(file_path)
+            return text_file
+
+        text_file = text_files[file_path] = TextFile(file_path)
+        while len(text_files) > TEXT_FILES_MAX:
+            _, old_file = text_files.popitem(last=False)
+            old_file.close()
+        return text_file
@@ -0,0 +1,271 @@
+import math
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from .profiling import profiler
+from .sources import fit_size, frame_size, load_fitted_frame_array
+
+
+TILE_SIZE = 256  # Edge length of pyramid tiles in pixels
+TILE_CACHE_BYTES = 256 * 1024 * 1024  # Default memory budget for decoded tiles
+TILE_MARGIN = 1  # Ring of tiles kept around the visible ones, so short pans need no decode
+ZOOM_MAX = 64.0
+ZOOM_STEP = 1.25  # Zoom factor of one mouse wheel notch
+TILE_SIZES_ENTRIES = 4096  # Original sizes of tiled sources remembered for previews
+
+
+class ZoomView:
+    """Zoom and pan shared by all panes
+
+    `center_x` and `center_y` are the image point shown in the middle of each
+    pane, as fractions of the image size, so panes of different resolutions
+    stay in sync. At zoom 1 images are fitted into their panes as usual.
+    """
+
+    def __init__(self, zoom=1.0, center_x=0.5, center_y=0.5):
+        self.zoom = zoom
+        self.center_x = center_x
+        self.center_y = center_y
+
+    @property
+    def zoomed(self):
+        return self.zoom > 1.0
+
+    def reset(self):
+        self.zoom, self.center_x, self.center_y = 1.0, 0.5, 0.5
+
+    def zoom_at(self, factor, offset_x=0.0, offset_y=0.0):
+        """Zoom by `factor`, keeping the image point under the pointer in place
+
+        The offsets are the pointer position relative to the pane centre, as
+        fractions of the pane's image box.
+        """
+        zoom = min(max(self.zoom * factor, 1.0), ZOOM_MAX)
+        self.center_x += offset_x / self.zoom - offset_x / zoom
+        self.center_y += offset_y / self.zoom - offset_y / zoom
+        self.zoom = zoom
+        self.clamp()
+
+    def pan(self, dx, dy):
+        """Move the view by a pointer drag, given as fractions of the pane's image box"""
+        self.center_x -= dx / self.zoom
+        self.center_y -= dy / self.zoom
+        self.clamp()
+
+    def clamp(self):
+        if not self.zoomed:
+            self.reset()
+            return
+        half = 0.5 / self.zoom
+        self.center_x = min(max(self.center_x, half), 1 - half)
+        self.center_y = min(max(self.center_y, half), 1 - half)
+
+    def region(self, img_width, img_height, box_width, box_height):
+        """Return the visible source region (x, y, width, height) and its size on screen"""
+        scale = min(box_width / img_width, box_height / img_height) * self.zoom
+        width = min(img_width, box_width / scale)
+        height = min(img_height, box_height / scale)
+        x = min(max(self.center_x * img_width - width / 2, 0), img_width - width)
+        y = min(max(self.center_y * img_height - height / 2, 0), img_height - height)
+        screen_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return (x, y, width, height), screen_size
+
+
+def cut_tile(frame, tx, ty):
+    return frame[ty * TILE_SIZE : (ty + 1) * TILE_SIZE, tx * TILE_SIZE : (tx + 1) * TILE_SIZE]
+
+
+class TileCache:
+    """Bounded LRU of multi-resolution tiles of pane entries, for drawing zoomed panes
+
+    Level k of an image is the image reduced by 2**k. A zoomed pane is drawn
+    from the coarsest level that still has at least screen resolution, so
+    moderate zooms decode at a reduced scale (see load_fitted_frame_array),
+    and only the tiles of the visible region of that level (plus a margin
+    for panning) are kept and resampled. Redrawing, panning and zooming
+    within those tiles decodes nothing.
+    """
+
+    def __init__(self, max_bytes=TILE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()  # (source key, level, tile x, tile y) -> RGB array
+        self.sizes = OrderedDict()  # Source key -> original size, for sources rendered before
+        self.pending = {}  # Source key -> Future of a prefetch preparing its tiles
+        self.lock = threading.Lock()
+
+    def level_size(self, img_width, img_height, level):
+        factor = 2 ** level
+        return fit_size(
+            img_width, img_height, max(1, img_width // factor), max(1, img_height // factor)
+        )
+
+    def original_size(self, source):
+        """Return the original size a source was rendered with before, or None"""
+        with self.lock:
+            return self.sizes.get(source)
+
+    def remember_size(self, source, original_size):
+        with self.lock:
+            self.sizes[source] = original_size
+            self.sizes.move_to_end(source)
+            if len(self.sizes) > TILE_SIZES_ENTRIES:
+                self.sizes.popitem(last=False)
+
+    def locate(self, original_size, view, box_width, box_height):
+        """Return the (level, level size, region, screen size) a view is drawn with
+
+        The region (x0, y0, x1, y1) is the visible part of the level, in its pixels.
+        """
+        img_width, img_height = original_size
+        (x, y, width, height), screen_size = view.region(
+            img_width, img_height, box_width, box_height
+        )
+
+        # Coarsest level with at least as many pixels as the screen shows
+        shrink = min(width / screen_size[0], height / screen_size[1])
+        level = max(0, int(math.floor(math.log2(shrink)))) if shrink >= 2 else 0
+        level_width, level_height = self.level_size(img_width, img_height, level)
+        scale_x, scale_y = level_width / img_width, level_height / img_height
+
+        x0, y0 = int(x * scale_x), int(y * scale_y)
+        x1 = min(level_width, max(x0 + 1, int(math.ceil((x + width) * scale_x))))
+        y1 = min(level_height, max(y0 + 1, int(math.ceil((y + height) * scale_y))))
+        return level, (level_width, level_height), (x0, y0, x1, y1), screen_size
+
+    def render(self, source, original_size, view, box_width, box_height, decode=True):
+        """Return the region of a source visible under `view`, resampled to its screen size
+
+        `source` is the (path, index, mtime, size) key of a pane entry, as used
+        by DecodeCache, and `original_size` its full resolution. Without
+        `decode`, None is returned unless all the tiles needed are cached.
+        """
+        self.remember_size(source, original_size)
+        if decode:
+            # Wait for an in-flight prefetch instead of decoding the same level twice
+            with self.lock:
+                future = self.pending.get(source)
+            if future is not None and not future.cancelled():
+                try:
+                    future.result()
+                except Exception:
+                    pass
+
+        level, level_size, (x0, y0, x1, y1), screen_size = self.locate(
+            original_size, view, box_width, box_height
+        )
+        tiles_x = range(x0 // TILE_SIZE, (x1 - 1) // TILE_SIZE + 1)
+        tiles_y = range(y0 // TILE_SIZE, (y1 - 1) // TILE_SIZE + 1)
+
+        rows = self.tiles(source, level, level_size, tiles_x, tiles_y, decode)
+        if rows is None:
+            return None
+        if len(rows) == 1 and len(rows[0]) == 1:
+            mosaic = rows[0][0]
+        else:
+            mosaic = np.vstack([np.hstack(row) for row in rows])
+        left, top = tiles_x[0] * TILE_SIZE, tiles_y[0] * TILE_SIZE
+        crop = mosaic[y0 - top : y1 - top, x0 - left : x1 - left]
+
+        with profiler.stage("tile_resample", level=level):
+            # Magnified pixels stay sharp squares, so single pixel detail can be inspected
+            magnify = screen_size[0] > crop.shape[1]
+            interpolation = cv2.INTER_NEAREST if magnify else cv2.INTER_AREA
+            return cv2.resize(crop, screen_size, interpolation=interpolation)
+
+    def prefetch(self, requests, executor):
+        """Prepare the tiles of (source, view, box_width, box_height) requests on `executor`
+
+        The original size of each source is probed, and the pyramid level its
+        view is drawn from decoded, in the background. Pending prefetches that
+        are no longer requested and have not started yet are cancelled.
+        """
+        wanted = set()
+        for source, view, box_width, box_height in requests:
+            wanted.add(source)
+            with self.lock:
+                if source in self.pending:
+                    continue
+                future = executor.submit(self.prepare, source, view, box_width, box_height)
+                self.pending[source] = future
+            future.add_done_callback(lambda f, source=source: self.on_prefetch_done(source))
+
+        with self.lock:
+            for source, future in list(self.pending.items()):
+                if source not in wanted and future.cancel():
+                    self.pending.pop(source, None)
+
+    def prepare(self, source, view, box_width, box_height):
+        original_size = self.original_size(source)
+        if original_size is None:
+            original_size = frame_size(source[0], source[1])
+            self.remember_size(source, original_size)
+        level, level_size, (x0, y0, x1, y1), _ = self.locate(
+            original_size, view, box_width, box_height
+        )
+        tiles_x = range(x0 // TILE_SIZE, (x1 - 1) // TILE_SIZE + 1)
+        tiles_y = range(y0 // TILE_SIZE, (y1 - 1) // TILE_SIZE + 1)
+        # Decodes the level unless the tiles are cached already
+        self.tiles(source, level, level_size, tiles_x, tiles_y)
+
+    def on_prefetch_done(self, source):
+        with self.lock:
+            self.pending.pop(source, None)
+
+    def tiles(self, source, level, level_size, tiles_x, tiles_y, decode=True):
+        """Return the rows of tiles of a level, decoding the level if any of them is missing
+
+        Without `decode`, None is returned instead of decoding.
+        """
+        keys = [[source + (level, tx, ty) for tx in tiles_x] for ty in tiles_y]
+        with self.lock:
+            rows = [[self.entries.get(key) for key in row] for row in keys]
+            for row in keys:
+                for key in row:
+                    if key in self.entries:
+                        self.entries.move_to_end(key)
+        if all(tile is not None for row in rows for tile in row):
+            return rows
+        if not decode:
+            return None
+
+        file_path, index = source[:2]
+        level_width, level_height = level_size
+        with profiler.stage("tile_decode", level=level):
+            frame, _ = load_fitted_frame_array(file_path, index, level_width, level_height)
+
+        # Keep the requested tiles and a margin around them, the rest of the level is dropped
+        columns = math.ceil(level_width / TILE_SIZE)
+        lines = math.ceil(level_height / TILE_SIZE)
+        keep_x = range(
+            max(0, tiles_x[0] - TILE_MARGIN), min(columns, tiles_x[-1] + TILE_MARGIN + 1)
+        )
+        keep_y = range(max(0, tiles_y[0] - TILE_MARGIN), min(lines, tiles_y[-1] + TILE_MARGIN + 1))
+        for ty in keep_y:
+            for tx in keep_x:
+                # Copied, so cached tiles do not keep the whole decoded level alive
+                self.store(source + (level, tx, ty), cut_tile(frame, tx, ty).copy())
+
+        return [[cut_tile(frame, tx, ty) for tx in tiles_x] for ty in tiles_y]
+
+    def store(self, key, tile):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return
+            self.entries[key] = tile
+            self.current_bytes += tile.nbytes
+
+            # Evict least recently used tiles until we are within budget
+            while self.current_bytes > self.max_bytes and len(self.entries) > 1:
+                _, old_tile = self.entries.popitem(last=False)
+                self.current_bytes -= old_tile.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.current_bytes = 0
@@ -1,27 +1,39 @@
 import re
 import os
-import cv2
-import glob
 import json
 import time
-import threading
-import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk, ImageDraw, ImageFont
+from PIL import Image, ImageTk
+
+from .alignment import ALIGN_MODES, Timeline
+from .cache import DecodeCache, ThumbnailCache, default_thumbnail_directory
+from .compositor import COMPOSITOR_BACKENDS, as_image, make_compositor
+from .config import PaneConfig
+from .derived import is_derived, parse_derived
+from .filelist import FileList
+from .encoders import ENCODERS, FFMPEG_CRF
+from .export import export_frame, select_frames
+from .fonts import FontRegistry
+from .index import DirectoryIndex, ScanCancelled, ScanJob
+from .jobs import ExportJob, ExportJobManager
+from .profiling import profiler
+from .sources import VIDEO_EXTENSIONS
+from .tiles import ZOOM_STEP, TileCache, ZoomView
 
 
 INIT_FPS = 5  # Default frames per second for playback
 INIT_PANE_LAYOUT = "1x1"  # Default pane layout
 INIT_BASE_DIR = "" if os.getenv("HOME") is None else os.getenv("HOME")  # Default base directory
-
-
-class PaneConfig:
-    def __init__(self, pattern="", enabled=True):
-        self.pattern = pattern
-        self.enabled = enabled
-        self.files = []
+PREFETCH_FRAMES = 8  # Number of upcoming frames decoded in the background
+PATTERN_DEBOUNCE_MS = 250  # Delay after the last keystroke before a pattern is resolved
+SCRUB_SETTLE_MS = 150  # Slider idle time after which the full resolution frame is rendered
+SCRUB_PREVIEW_SCALE = 2  # Scrubbing previews are rendered at 1/SCRUB_PREVIEW_SCALE resolution
+HUD_FPS_FRAMES = 30  # Displayed frames the overlay's achieved FPS is averaged over
+JOB_POLL_MS = 100  # How often closing the window checks whether cancelled exports stopped
 
 
 class FileVisualizationSoftware:
@@ -38,10 +50,35 @@ class FileVisualizationSoftware:
         self.base_directory = INIT_BASE_DIR
         self.pane_configs = {}  # Dictionary to store pane configurations
         self.max_frames = 0
+        self.timeline = Timeline({})
+        self.playback_after_id = None
+        self.scrub_after_id = None
+        self.settle_after_id = None
+        self.zoom_view = ZoomView()  # Zoom and pan shared by all panes
+        self.tile_cache = TileCache()
+        self.drag_position = None
+        self.view_redraw_id = None
+        self.compositor = make_compositor(tile_cache=self.tile_cache)
+        # Scrubbing previews have their own buffers so the full size ones are not reallocated
+        self.preview_compositor = make_compositor(
+            "pil", self.compositor.decode_cache, self.compositor.fonts, self.tile_cache
+        )
+        self.display_times = deque(maxlen=HUD_FPS_FRAMES)  # When recent frames were displayed
+        self.photo_is_composite = False  # Whether the canvas shows the full size composite
+        self.pane_photos = {}  # Pane size -> PhotoImage that changed panes go through
+        self.directory_index = DirectoryIndex(self.base_directory)
+        self.index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tkFV-index")
+        # Job changes arrive on the export threads and are handled on the Tk thread
+        self.export_jobs = ExportJobManager(
+            on_change=lambda job: self.root.after(0, self.on_export_job_changed, job)
+        )
+        self.job_rows = {}  # ExportJob -> row of the job list
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Setup GUI
         self.setup_gui()
         self.initialize_panes()
+        self.toggle_thumbnail_cache()
 
     def setup_gui(self):
         # Create main paned window
@@ -105,6 +142,32 @@ class FileVisualizationSoftware:
         layout_combo.pack(fill=tk.X, pady=2)
         layout_combo.bind("<<ComboboxSelected>>", self.on_layout_change)
 
+        ttk.Label(layout_frame, text="Frame Alignment:").pack(anchor=tk.W)
+        self.align_mode_var = tk.StringVar(value="position")
+        align_combo = ttk.Combobox(
+            layout_frame, textvariable=self.align_mode_var, values=ALIGN_MODES, state="readonly"
+        )
+        align_combo.pack(fill=tk.X, pady=2)
+        align_combo.bind("<<ComboboxSelected>>", lambda e: self.update_max_frames())
+
+        ttk.Label(layout_frame, text="Key regex (optional):").pack(anchor=tk.W)
+        self.align_key_var = tk.StringVar()
+        align_key_entry = ttk.Entry(layout_frame, textvariable=self.align_key_var)
+        align_key_entry.pack(fill=tk.X, pady=2)
+        align_key_entry.bind("<Return>", lambda e: self.update_max_frames())
+        align_key_entry.bind("<FocusOut>", lambda e: self.update_max_frames())
+
+        ttk.Label(layout_frame, text="Rendering Backend:").pack(anchor=tk.W)
+        self.backend_var = tk.StringVar(value="pil")
+        backend_combo = ttk.Combobox(
+            layout_frame,
+            textvariable=self.backend_var,
+            values=COMPOSITOR_BACKENDS,
+            state="readonly",
+        )
+        backend_combo.pack(fill=tk.X, pady=2)
+        backend_combo.bind("<<ComboboxSelected>>", self.on_backend_change)
+
         # Pane configuration area
         self.pane_config_frame = ttk.LabelFrame(
             scrollable_frame, text="Pane Patterns", padding="10"
@@ -134,6 +197,11 @@ class FileVisualizationSoftware:
         fps_entry.pack(side=tk.LEFT, padx=5)
         fps_entry.bind("<Return>", self.update_fps)
 
+        self.drop_frames_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            playback_frame, text="Drop frames to keep up", variable=self.drop_frames_var
+        ).pack(anchor=tk.W)
+
         # Frame control
         ttk.Label(playback_frame, text="Frame Navigation:").pack(anchor=tk.W, pady=(10, 0))
         self.frame_var = tk.IntVar()
@@ -162,10 +230,96 @@ class FileVisualizationSoftware:
             action_frame, text="Preview Current Frame", command=self.visualize_current_frame
         ).pack(fill=tk.X, pady=2)
 
+        self.thumbnail_cache_var = tk.BooleanVar(value=bool(os.getenv("TKFV_THUMBNAIL_CACHE")))
+        ttk.Checkbutton(
+            action_frame,
+            text="Cache thumbnails on disk",
+            variable=self.thumbnail_cache_var,
+            command=self.toggle_thumbnail_cache,
+        ).pack(anchor=tk.W, pady=2)
+
+        # Performance instrumentation
+        self.hud_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            action_frame,
+            text="Show performance overlay",
+            variable=self.hud_var,
+            command=self.toggle_profiling,
+        ).pack(anchor=tk.W, pady=2)
+
+        self.trace_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            action_frame,
+            text="Record performance trace",
+            variable=self.trace_var,
+            command=self.toggle_profiling,
+        ).pack(anchor=tk.W, pady=2)
+
+        ttk.Button(action_frame, text="Save Performance Trace", command=self.save_trace).pack(
+            fill=tk.X, pady=2
+        )
+
         # Export controls
         export_frame = ttk.LabelFrame(scrollable_frame, text="Export", padding="10")
         export_frame.pack(fill=tk.X, padx=5, pady=5)
 
+        workers_frame = ttk.Frame(export_frame)
+        workers_frame.pack(fill=tk.X, pady=2)
+
+        ttk.Label(workers_frame, text="Worker processes:").pack(side=tk.LEFT)
+        self.export_workers_var = tk.StringVar(value=str(os.cpu_count() or 1))
+        ttk.Entry(workers_frame, textvariable=self.export_workers_var, width=4).pack(
+            side=tk.LEFT, padx=5
+        )
+        # Jobs run side by side as long as their worker processes fit into this many CPUs
+        ttk.Label(workers_frame, text="CPU budget:").pack(side=tk.LEFT)
+        self.cpu_budget_var = tk.StringVar(value=str(self.export_jobs.cpu_budget))
+        ttk.Entry(workers_frame, textvariable=self.cpu_budget_var, width=4).pack(
+            side=tk.LEFT, padx=5
+        )
+
+        encoder_frame = ttk.Frame(export_frame)
+        encoder_frame.pack(fill=tk.X, pady=2)
+
+        ttk.Label(encoder_frame, text="Video encoder:").pack(side=tk.LEFT)
+        self.encoder_var = tk.StringVar(value="opencv")
+        ttk.Combobox(
+            encoder_frame, textvariable=self.encoder_var, values=ENCODERS, state="readonly",
+            width=8,
+        ).pack(side=tk.LEFT, padx=5)
+        ttk.Label(encoder_frame, text="CRF:").pack(side=tk.LEFT)
+        self.crf_var = tk.StringVar(value=str(FFMPEG_CRF))
+        ttk.Entry(encoder_frame, textvariable=self.crf_var, width=4).pack(side=tk.LEFT, padx=5)
+
+        range_frame = ttk.Frame(export_frame)
+        range_frame.pack(fill=tk.X, pady=2)
+
+        # Blank fields export everything: from the first to the last frame, at the canvas size
+        self.export_start_var = tk.StringVar()
+        self.export_end_var = tk.StringVar()
+        self.export_stride_var = tk.StringVar(value="1")
+        for label, var in (
+            ("Start:", self.export_start_var),
+            ("End:", self.export_end_var),
+            ("Every:", self.export_stride_var),
+        ):
+            ttk.Label(range_frame, text=label).pack(side=tk.LEFT)
+            ttk.Entry(range_frame, textvariable=var, width=6).pack(side=tk.LEFT, padx=(2, 6))
+
+        size_frame = ttk.Frame(export_frame)
+        size_frame.pack(fill=tk.X, pady=2)
+
+        ttk.Label(size_frame, text="Size (WxH):").pack(side=tk.LEFT)
+        self.export_size_var = tk.StringVar()
+        ttk.Entry(size_frame, textvariable=self.export_size_var, width=10).pack(
+            side=tk.LEFT, padx=(2, 6)
+        )
+        ttk.Label(size_frame, text="Max seconds:").pack(side=tk.LEFT)
+        self.export_duration_var = tk.StringVar()
+        ttk.Entry(size_frame, textvariable=self.export_duration_var, width=6).pack(
+            side=tk.LEFT, padx=2
+        )
+
         ttk.Button(export_frame, text="Export as Video", command=self.export_video).pack(
             fill=tk.X, pady=2
         )
@@ -173,6 +327,30 @@ class FileVisualizationSoftware:
             fill=tk.X, pady=2
         )
 
+        # Export jobs, newest last
+        self.job_list = ttk.Treeview(
+            export_frame, columns=("output", "state", "progress"), show="headings", height=4
+        )
+        for column, title, width in (
+            ("output", "Output", 90),
+            ("state", "State", 60),
+            ("progress", "Progress", 180),
+        ):
+            self.job_list.heading(column, text=title)
+            self.job_list.column(column, width=width, stretch=column == "progress")
+        self.job_list.pack(fill=tk.X, pady=2)
+
+        job_buttons = ttk.Frame(export_frame)
+        job_buttons.pack(fill=tk.X, pady=2)
+        for text, command in (
+            ("Pause/Resume", self.toggle_pause_jobs),
+            ("Cancel", self.cancel_jobs),
+            ("Clear Finished", self.clear_finished_jobs),
+        ):
+            ttk.Button(job_buttons, text=text, command=command).pack(
+                side=tk.LEFT, expand=True, fill=tk.X
+            )
+
         # Configuration save/load
         config_frame = ttk.LabelFrame(scrollable_frame, text="Configuration", padding="10")
         config_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -195,19 +373,119 @@ class FileVisualizationSoftware:
         # Bind canvas resize
         self.canvas.bind("<Configure>", self.on_canvas_resize)
 
+        # The mouse wheel zooms and dragging pans all panes together, a double-click resets
+        self.canvas.bind("<MouseWheel>", self.on_canvas_wheel)
+        self.canvas.bind("<Button-4>", self.on_canvas_wheel)  # X11 reports the wheel as buttons
+        self.canvas.bind("<Button-5>", self.on_canvas_wheel)
+        self.canvas.bind("<ButtonPress-1>", self.on_canvas_press)
+        self.canvas.bind("<B1-Motion>", self.on_canvas_drag)
+        self.canvas.bind("<Double-Button-1>", self.reset_zoom)
+
     def on_canvas_resize(self, event):
         # Redraw when canvas is resized
         if hasattr(self, "current_image"):
             self.root.after(100, self.visualize_current_frame)
 
+    def pane_box_at(self, x, y):
+        """Return the centre and size of the image box of the pane under a canvas position"""
+        for pane_x, pane_y, pane_width, pane_height in self.compositor.rects:
+            if pane_x <= x < pane_x + pane_width and pane_y <= y < pane_y + pane_height:
+                box_width, box_height = self.compositor.image_box_size(pane_width, pane_height - 25)
+                # Images are centred in the content area above the info line, see the compositor
+                center_y = pane_y + 25 + (pane_height - 45) / 2
+                return pane_x + pane_width / 2, center_y, box_width, box_height
+        return None
+
+    def on_canvas_wheel(self, event):
+        zoom_in = event.num == 4 or getattr(event, "delta", 0) > 0
+        offset_x = offset_y = 0.0
+        box = self.pane_box_at(event.x, event.y)
+        if box is not None:
+            center_x, center_y, box_width, box_height = box
+            offset_x = (event.x - center_x) / max(1, box_width)
+            offset_y = (event.y - center_y) / max(1, box_height)
+        self.zoom_view.zoom_at(ZOOM_STEP if zoom_in else 1 / ZOOM_STEP, offset_x, offset_y)
+        self.request_view_redraw()
+
+    def on_canvas_press(self, event):
+        self.drag_position = (event.x, event.y)
+
+    def on_canvas_drag(self, event):
+        if self.drag_position is None:
+            return
+        last_x, last_y = self.drag_position
+        self.drag_position = (event.x, event.y)
+        box = self.pane_box_at(last_x, last_y)
+        if box is None or not self.zoom_view.zoomed:
+            return
+
+        _, _, box_width, box_height = box
+        self.zoom_view.pan(
+            (event.x - last_x) / max(1, box_width), (event.y - last_y) / max(1, box_height)
+        )
+        self.request_view_redraw()
+
+    def reset_zoom(self, event=None):
+        self.zoom_view.reset()
+        self.request_view_redraw()
+
+    def request_view_redraw(self):
+        # Wheel and drag events come in bursts, redraw once for the latest view
+        if self.view_redraw_id is None:
+            self.view_redraw_id = self.root.after_idle(self.redraw_view)
+
+    def redraw_view(self):
+        self.view_redraw_id = None
+        if self.zoom_view.zoomed:
+            self.update_status(f"Zoom {self.zoom_view.zoom:.1f}x (double-click to reset)")
+        else:
+            self.update_status("Zoom reset")
+        if not self.is_playing:
+            self.visualize_current_frame()
+
+    def toggle_thumbnail_cache(self):
+        decode_cache = self.compositor.decode_cache
+        if not self.thumbnail_cache_var.get():
+            decode_cache.disk_cache = None
+            return
+
+        directory = default_thumbnail_directory()
+        try:
+            decode_cache.disk_cache = ThumbnailCache(directory)
+            self.update_status(f"Caching thumbnails in {directory}")
+        except OSError as e:
+            self.thumbnail_cache_var.set(False)
+            messagebox.showerror("Error", f"Failed to create thumbnail cache: {str(e)}")
+
+    def on_backend_change(self, event=None):
+        backend = self.backend_var.get()
+        if backend == self.compositor.backend:
+            return
+
+        # PIL images and arrays cannot share a decode cache; keep the disk cache though
+        old_cache = self.compositor.decode_cache
+        decode_cache = DecodeCache(disk_cache=old_cache.disk_cache, arrays=backend == "opencv")
+        fonts = self.compositor.fonts
+        self.compositor = make_compositor(backend, decode_cache, fonts, self.tile_cache)
+        self.preview_compositor = make_compositor(backend, decode_cache, fonts, self.tile_cache)
+        old_cache.shutdown()
+
+        if not self.is_playing:
+            self.visualize_current_frame()
+
     def select_base_directory(self):
         directory = filedialog.askdirectory()
         if directory:
-            self.base_directory = directory
-            self.dir_label.config(text=f"Base: {directory}")
+            self.set_base_directory(directory)
             self.refresh_all_patterns()
             self.update_status(f"Base directory set to: {directory}")
 
+    def set_base_directory(self, directory):
+        self.base_directory = directory
+        self.dir_label.config(text=f"Base: {directory}")
+        if directory != self.directory_index.base_directory:
+            self.directory_index = DirectoryIndex(directory)
+
     def initialize_panes(self):
         self.create_pane_widgets()
 
@@ -217,6 +495,15 @@ class FileVisualizationSoftware:
             self.refresh_all_patterns()
 
     def create_pane_widgets(self):
+        # Stop the pending pattern resolves and scans of the panes that are about to be replaced
+        for config in self.pane_configs.values():
+            if config.debounce_id is not None:
+                self.root.after_cancel(config.debounce_id)
+                config.debounce_id = None
+            if config.scan_job is not None:
+                config.scan_job.cancel()
+                config.scan_job = None
+
         # Clear existing widgets
         for widget in self.pane_config_frame.winfo_children():
             widget.destroy()
@@ -236,16 +523,24 @@ class FileVisualizationSoftware:
             enabled_var = tk.BooleanVar(value=True)
             ttk.Checkbutton(pane_frame, text="Enabled", variable=enabled_var).pack(anchor=tk.W)
 
+            # Follow checkbox
+            follow_var = tk.BooleanVar(value=False)
+            ttk.Checkbutton(
+                pane_frame, text="Follow end of text files", variable=follow_var
+            ).pack(anchor=tk.W)
+
             # Pattern entry
             ttk.Label(pane_frame, text="File Pattern:").pack(anchor=tk.W)
             pattern_var = tk.StringVar()
             pattern_entry = ttk.Entry(pane_frame, textvariable=pattern_var, width=50)
             pattern_entry.pack(fill=tk.X, pady=2)
+            pattern_entry.bind("<Escape>", lambda e, idx=i: self.cancel_scan(idx))
 
             # Helper text
             ttk.Label(
                 pane_frame,
-                text="Examples: images/*.png, data/frame_*.jpg, logs/log_*.txt",
+                text="Examples: images/*.png, data/frame_*.jpg, logs/log_*.txt, arrays/stack.npy"
+                " (Esc cancels a running scan)",
                 font=("TkDefaultFont", 8),
                 foreground="gray",
             ).pack(anchor=tk.W)
@@ -263,15 +558,19 @@ class FileVisualizationSoftware:
             # Store references
             config = PaneConfig()
             config.enabled_var = enabled_var
+            config.follow_var = follow_var
             config.pattern_var = pattern_var
             config.count_label = count_label
             config.pattern_entry = pattern_entry
+            config.debounce_id = None
+            config.scan_job = None  # ScanJob of the pattern match in progress
 
             self.pane_configs[i] = config
 
             # Bind pattern change
             pattern_var.trace("w", lambda *args, idx=i: self.on_pattern_change(idx))
             enabled_var.trace("w", lambda *args, idx=i: self.on_pattern_change(idx))
+            follow_var.trace("w", lambda *args, idx=i: self.on_follow_change(idx))
 
     def browse_pattern(self, pane_idx):
         if not self.base_directory:
@@ -282,6 +581,8 @@ class FileVisualizationSoftware:
         filetypes = [
             ("Image files", "*.png *.jpg *.jpeg *.gif *.bmp"),
             ("Text files", "*.txt *.log *.csv"),
+            ("Array files", "*.npy *.npz"),
+            ("Video files", "*.mp4 *.avi *.mov *.mkv *.webm *.m4v"),
             ("Code files", "*.py *.js *.html *.css *.json"),
             ("All files", "*.*"),
         ]
@@ -306,7 +607,10 @@ class FileVisualizationSoftware:
 
             # Find the last sequence of digits in the filename
             match = re.search(r"(.+?)(\d+)$", file_basename)
-            if match:
+            if file_ext.lower() in VIDEO_EXTENSIONS:
+                # A video already holds the whole frame sequence
+                pattern = rel_path
+            elif match:
                 # If the filename has a numeric suffix, replace it with *
                 prefix = match.group(1)
                 pattern = os.path.join(pattern_dir, f"{prefix}*{file_ext}")
@@ -316,35 +620,110 @@ class FileVisualizationSoftware:
 
             self.pane_configs[pane_idx].pattern_var.set(pattern)
 
-    def extract_numbers(self, filename):
-        numbers = re.findall(r"\d+", filename)
-        return tuple(map(int, numbers))
-
     def on_pattern_change(self, pane_idx):
+        config = self.pane_configs[pane_idx]
+        config.pattern = config.pattern_var.get()
+        config.enabled = config.enabled_var.get()
+
         if not self.base_directory:
             return
 
-        config = self.pane_configs[pane_idx]
-        pattern = config.pattern_var.get().strip()
+        # A running scan for the previous pattern is of no use anymore
+        if config.scan_job is not None:
+            config.scan_job.cancel()
 
-        if pattern and config.enabled_var.get():
-            # Resolve pattern relative to base directory
-            full_pattern = os.path.join(self.base_directory, pattern)
-            try:
-                files = sorted(glob.glob(full_pattern), key=self.extract_numbers)
-                config.files = files
-                config.count_label.config(text=f"Files: {len(files)}")
+        # Debounce keystrokes: resolve only once typing pauses
+        if config.debounce_id is not None:
+            self.root.after_cancel(config.debounce_id)
+        config.debounce_id = self.root.after(
+            PATTERN_DEBOUNCE_MS, self.resolve_pane_pattern, pane_idx
+        )
 
-                if files:
-                    config.count_label.config(foreground="green")
-                else:
-                    config.count_label.config(foreground="red")
-            except Exception as e:
-                config.files = []
+    def on_follow_change(self, pane_idx):
+        self.pane_configs[pane_idx].follow = self.pane_configs[pane_idx].follow_var.get()
+        if not self.is_playing:
+            self.visualize_current_frame()
+
+    def resolve_pane_pattern(self, pane_idx):
+        config = self.pane_configs[pane_idx]
+        if config.debounce_id is not None:
+            self.root.after_cancel(config.debounce_id)
+            config.debounce_id = None
+
+        pattern = config.pattern.strip()
+        if config.scan_job is not None:
+            config.scan_job.cancel()
+
+        if is_derived(pattern) and config.enabled:
+            # Derived panes have no files, they are computed from their source panes
+            config.scan_job = None
+            config.files = FileList()
+            try:
+                spec = parse_derived(pattern)
+                sources = " and ".join(f"P{source + 1}" for source in spec.sources)
+                config.count_label.config(text=f"Derived: {spec.op} of {sources}",
+                                          foreground="green")
+            except ValueError as e:
                 config.count_label.config(text=f"Error: {str(e)}", foreground="red")
+            self.update_max_frames()
+        elif pattern and config.enabled:
+            # Match against the directory index on its worker thread; the current file list
+            # stays in use until the new one is complete
+            job = config.scan_job = ScanJob(
+                lambda directories, entries: self.root.after(
+                    0, self.on_scan_progress, config, job, directories, entries
+                )
+            )
+            config.count_label.config(text="Scanning...", foreground="blue")
+            future = self.index_executor.submit(
+                self.match_pattern, self.directory_index, pattern, job
+            )
+            future.add_done_callback(
+                lambda f: self.root.after(0, self.on_pattern_resolved, config, job, f)
+            )
         else:
-            config.files = []
+            config.scan_job = None
+            config.files = FileList()
             config.count_label.config(text="Files: 0 (disabled)", foreground="gray")
+            self.update_max_frames()
+
+    def cancel_scan(self, pane_idx):
+        config = self.pane_configs[pane_idx]
+        if config.scan_job is not None:
+            config.scan_job.cancel()
+
+    def match_pattern(self, directory_index, pattern, job):
+        with profiler.stage("glob", pattern=pattern):
+            return directory_index.match(pattern, job)
+
+    def on_scan_progress(self, config, job, directories, entries):
+        if config.scan_job is job:
+            config.count_label.config(
+                text=f"Scanning... {directories:,} directories, {entries:,} entries"
+            )
+
+    def on_pattern_resolved(self, config, job, future):
+        # Ignore results superseded by a newer pattern or a layout change
+        if config.scan_job is not job:
+            return
+        config.scan_job = None
+
+        try:
+            # Swap the complete list in at once, on the Tk thread
+            files = future.result()
+            config.files = files
+            config.count_label.config(text=f"Files: {len(files)}")
+
+            if files:
+                config.count_label.config(foreground="green")
+            else:
+                config.count_label.config(foreground="red")
+        except ScanCancelled:
+            config.count_label.config(text="Scan cancelled", foreground="gray")
+            return
+        except Exception as e:
+            config.files = FileList()
+            config.count_label.config(text=f"Error: {str(e)}", foreground="red")
 
         self.update_max_frames()
 
@@ -352,23 +731,47 @@ class FileVisualizationSoftware:
         if not self.base_directory:
             return
 
+        # Re-list only the indexed directories that changed, then re-match every pane
+        self.compositor.invalidate()
+        refresh = self.index_executor.submit(self.directory_index.refresh)
         for i in self.pane_configs:
-            self.on_pattern_change(i)
+            self.resolve_pane_pattern(i)
 
-        self.update_status("All patterns refreshed")
+        refresh.add_done_callback(
+            lambda f: self.root.after(
+                0, self.update_status, f"All patterns refreshed ({f.result()} directories changed)"
+            )
+        )
 
-    def update_max_frames(self):
-        # Calculate maximum frames needed
-        max_files = 0
-        for config in self.pane_configs.values():
-            if config.enabled_var.get():
-                max_files = max(max_files, len(config.files))
+    def build_timeline(self, panes):
+        """Join the panes' frames according to the alignment settings"""
+        return Timeline(panes, self.align_mode_var.get(), self.align_key_var.get() or None)
 
-        self.max_frames = max_files
-        self.frame_scale.config(to=max(0, max_files - 1))
+    def update_max_frames(self):
+        # Join the panes' frames; the timeline length is the number of frames to step through
+        try:
+            self.timeline = self.build_timeline(self.pane_configs)
+        except ValueError as e:
+            self.update_status(f"{e}, aligning frames by position")
+            self.timeline = Timeline(self.pane_configs)
+
+        if self.timeline.keyless:
+            panes = ", ".join(f"P{i + 1}" for i in self.timeline.keyless)
+            self.update_status(f"No frame keys in the file names of {panes}, left out of alignment")
+
+        self.max_frames = len(self.timeline)
+        self.frame_scale.config(to=max(0, self.max_frames - 1))
+        if self.current_frame >= self.max_frames:
+            self.current_frame = 0
+            self.frame_var.set(0)
         self.update_frame_label()
 
-    def visualize_current_frame(self):
+    def visualize_current_frame(self, preview=False):
+        """Render the current frame onto the canvas
+
+        A `preview` is rendered at reduced resolution from whatever the decode
+        cache already holds, and only queues the decodes of its own frame.
+        """
         if not self.base_directory:
             self.update_status("Please select a base directory first")
             return
@@ -382,242 +785,151 @@ class FileVisualizationSoftware:
                 self.root.after(100, self.visualize_current_frame)
                 return
 
-            # Parse layout
-            rows, cols = map(int, self.layout_var.get().split("x"))
-
-            # Create main composite image
-            composite_img = Image.new("RGB", (canvas_width, canvas_height), "black")
-
-            # Calculate pane dimensions
-            pane_width = canvas_width // cols
-            pane_height = canvas_height // rows
-
-            # Draw each pane
-            for i in range(rows * cols):
-                if i not in self.pane_configs:
-                    continue
-
-                config = self.pane_configs[i]
-                if not config.enabled_var.get():
-                    continue
-
-                row = i // cols
-                col = i % cols
-
-                x = col * pane_width
-                y = row * pane_height
+            frame_start = time.perf_counter()
+            layout = self.layout_var.get()
+            # Frames of the OpenCV backend are arrays, converted to an image only here
+            if preview:
+                composite_img = as_image(
+                    self.preview_compositor.render(
+                        layout, self.pane_configs, self.current_frame,
+                        max(1, canvas_width // SCRUB_PREVIEW_SCALE),
+                        max(1, canvas_height // SCRUB_PREVIEW_SCALE),
+                        self.timeline, preview=True, view=self.zoom_view,
+                    )
+                ).resize((canvas_width, canvas_height), Image.BILINEAR)
+            else:
+                composite_img = self.compositor.render(
+                    layout, self.pane_configs, self.current_frame, canvas_width,
+                    canvas_height, self.timeline, view=self.zoom_view,
+                )
 
-                # Get file for current frame
-                if self.current_frame < len(config.files):
-                    file_path = config.files[self.current_frame]
-                    pane_img = self.create_file_pane(file_path, pane_width, pane_height, i + 1)
+            # Blit into the persistent PhotoImage; it is only replaced when the canvas size changes
+            photo = getattr(self, "current_image", None)
+            if photo is None or (photo.width(), photo.height()) != (canvas_width, canvas_height):
+                self.current_image = ImageTk.PhotoImage("RGB", (canvas_width, canvas_height))
+                self.canvas.delete("all")
+                self.canvas.create_image(
+                    canvas_width // 2, canvas_height // 2, image=self.current_image
+                )
+                self.photo_is_composite = False
+            with profiler.stage("photoimage"):
+                if preview or not self.photo_is_composite:
+                    self.current_image.paste(as_image(composite_img))
                 else:
-                    pane_img = self.create_empty_pane(pane_width, pane_height, i + 1)
-
-                # Paste the pane image onto the composite
-                composite_img.paste(pane_img, (x, y))
-
-            # Convert to PhotoImage and display
-            self.current_image = ImageTk.PhotoImage(composite_img)
-            self.canvas.delete("all")
-            self.canvas.create_image(
-                canvas_width // 2, canvas_height // 2, image=self.current_image
-            )
+                    self.paste_dirty_panes(composite_img)
+                # Only unchanged panes of a full resolution composite can be kept on screen
+                self.photo_is_composite = not preview
+
+            frame_end = time.perf_counter()
+            profiler.record("frame", frame_start, frame_end, {"preview": preview})
+            self.display_times.append(frame_end)
+            if profiler.enabled:
+                # Tk redraws the canvas in an idle handler queued by the paste, so the next
+                # idle callback runs once the frame has actually been blitted to the screen
+                self.root.after_idle(self.on_frame_blitted, frame_end)
+            if self.hud_var.get():
+                self.draw_hud()
+
+            # Decode upcoming frames while this one is on screen. Previews never decode, so
+            # they queue the full size decodes of their own frame for the settle render
+            if self.max_frames > 0:
+                upcoming = [self.current_frame] if preview else [
+                    (self.current_frame + step) % self.max_frames
+                    for step in range(1, PREFETCH_FRAMES + 1)
+                ]
+                self.compositor.prefetch(
+                    layout, self.pane_configs, upcoming, canvas_width, canvas_height,
+                    self.timeline, self.zoom_view,
+                )
 
         except Exception as e:
             self.update_status(f"Visualization error: {str(e)}")
             print(f"Visualization error: {str(e)}")  # Debug print
 
-    def create_file_pane(self, file_path, width, height, pane_num):
-        """Create a PIL Image for a single pane displaying a file"""
-        pane_img = Image.new("RGB", (width, height), "black")
-        draw = ImageDraw.Draw(pane_img)
-
-        try:
-            # Draw border
-            draw.rectangle([0, 0, width - 1, height - 1], outline="white")
-
-            # File info
-            filename = os.path.basename(file_path)
-            file_ext = os.path.splitext(filename)[1].lower()
+    def on_frame_blitted(self, blit_start):
+        profiler.record("tk_blit", blit_start, time.perf_counter())
+
+    def toggle_profiling(self):
+        enabled = self.hud_var.get() or self.trace_var.get()
+        if enabled and not profiler.enabled:
+            # Start a fresh session so the trace and hit rate only cover what was just measured
+            profiler.clear()
+            self.compositor.decode_cache.reset_stats()
+        profiler.enabled = enabled
+
+        if not self.hud_var.get():
+            self.canvas.delete("hud")
+        elif not self.is_playing:
+            self.visualize_current_frame()
+
+    def paste_dirty_panes(self, composite):
+        """Update only the pane rectangles the compositor redrew in the on-screen PhotoImage"""
+        dirty_rects = self.compositor.dirty_rects
+        if len(dirty_rects) == len(self.compositor.rects):
+            self.current_image.paste(as_image(composite))
+            return
 
-            # Try to load font
-            try:
-                font = ImageFont.truetype("arial.ttf", 12)
-                small_font = ImageFont.truetype("arial.ttf", 10)
-            except:
-                font = ImageFont.load_default()
-                small_font = ImageFont.load_default()
-
-            # Draw pane number and filename
-            header_text = f"P{pane_num}: {filename[:25]}" + ("..." if len(filename) > 25 else "")
-            draw.text((5, 5), header_text, fill="yellow", font=font)
-
-            content_y = 25
-            content_height = height - 25
-
-            # Handle different file types
-            if file_ext in [".jpg", ".jpeg", ".png", ".bmp", ".gif"]:
-                self.draw_image_content_on_pane(
-                    pane_img, draw, file_path, 0, content_y, width, content_height
-                )
-            elif file_ext in [
-                ".txt",
-                ".py",
-                ".js",
-                ".html",
-                ".css",
-                ".json",
-                ".xml",
-                ".log",
-                ".csv",
-            ]:
-                self.draw_text_content(
-                    draw, file_path, 0, content_y, width, content_height, small_font
+        for x, y, width, height in dirty_rects:
+            # Panes go through a PhotoImage of their size and are copied into place by Tk
+            scratch = self.pane_photos.get((width, height))
+            if scratch is None:
+                scratch = self.pane_photos[(width, height)] = ImageTk.PhotoImage(
+                    "RGB", (width, height)
                 )
+            if isinstance(composite, Image.Image):
+                scratch.paste(composite.crop((x, y, x + width, y + height)))
             else:
-                self.draw_generic_content(
-                    draw, file_path, 0, content_y, width, content_height, font
-                )
-
-        except Exception as e:
-            draw.text((5, 30), f"Error: {str(e)}", fill="red", font=font)
-            print(f"Error in create_file_pane: {str(e)}")  # Debug print
-
-        return pane_img
-
-    def create_empty_pane(self, width, height, pane_num):
-        """Create a PIL Image for an empty pane"""
-        pane_img = Image.new("RGB", (width, height), "black")
-        draw = ImageDraw.Draw(pane_img)
-
-        # Draw border
-        draw.rectangle([0, 0, width - 1, height - 1], outline="gray")
-
-        try:
-            font = ImageFont.truetype("arial.ttf", 12)
-        except:
-            font = ImageFont.load_default()
-
-        # Draw pane info
-        draw.text((5, 5), f"Pane {pane_num}: No file", fill="gray", font=font)
-        draw.text((width // 2 - 30, height // 2), "Empty", fill="gray", font=font)
-
-        return pane_img
-
-    def draw_image_content_on_pane(self, pane_img, draw, file_path, x, y, width, height):
-        """Load and draw actual image content onto the pane"""
-        try:
-            with Image.open(file_path) as img:
-                # Convert to RGB if needed (handles RGBA, grayscale, etc.)
-                if img.mode != "RGB":
-                    img = img.convert("RGB")
-
-                # Calculate scaling to fit within the content area with padding
-                content_width = width - 10  # Leave 5px padding on each side
-                content_height = height - 30  # Leave space for image info text
-
-                # Calculate aspect ratio preserving dimensions
-                img_ratio = img.width / img.height
-                content_ratio = content_width / content_height
-
-                if img_ratio > content_ratio:
-                    # Image is wider than content area
-                    new_width = content_width
-                    new_height = int(content_width / img_ratio)
-                else:
-                    # Image is taller than content area
-                    new_height = content_height
-                    new_width = int(content_height * img_ratio)
-
-                # Resize the image
-                img_resized = img.resize((new_width, new_height), Image.BILINEAR)
-
-                # Calculate centering position
-                paste_x = x + (width - new_width) // 2
-                paste_y = y + (height - new_height - 20) // 2  # Extra space for info text
-
-                # Paste the actual image onto the pane
-                pane_img.paste(img_resized, (paste_x, paste_y))
-
-                # Draw image info at the bottom
-                try:
-                    info_font = ImageFont.truetype("arial.ttf", 10)
-                except:
-                    info_font = ImageFont.load_default()
-
-                info_text = f"Image: {img.width}x{img.height} -> {new_width}x{new_height}"
-                draw.text((x + 5, y + height - 15), info_text, fill="cyan", font=info_font)
-
-        except Exception as e:
-            # If image loading fails, draw error message
-            draw.text((x + 5, y + 10), f"Image load error: {str(e)}", fill="red")
-            print(f"Image loading error for {file_path}: {str(e)}")
-
-    def draw_text_content(self, draw, file_path, x, y, width, height, font):
-        try:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read(800)  # First 800 characters
-
-            # Split into lines
-            lines = content.split("\n")
-            y_offset = 5
-            line_height = 12
-            max_lines = (height - 30) // line_height
-
-            for line in lines[:max_lines]:
-                if y_offset + line_height > height - 25:
-                    break
-
-                # Truncate long lines
-                max_chars = (width - 10) // 6  # Rough character width estimation
-                if len(line) > max_chars:
-                    line = line[: max_chars - 3] + "..."
-
-                draw.text((x + 5, y + y_offset), line, fill="lightgreen", font=font)
-                y_offset += line_height
-
-            # File stats
-            file_size = os.path.getsize(file_path)
-            size_text = f"Size: {file_size} bytes"
-            draw.text((x + 5, y + height - 15), size_text, fill="gray", font=font)
-
-        except Exception as e:
-            draw.text((x + 5, y + 10), f"Text error: {str(e)}", fill="red", font=font)
+                scratch.paste(as_image(composite[y : y + height, x : x + width]))
+            self.root.tk.call(str(self.current_image), "copy", str(scratch), "-to", x, y)
+
+    def draw_hud(self):
+        """Draw the performance overlay in the top left corner of the canvas"""
+        lines = []
+        if len(self.display_times) > 1:
+            span = self.display_times[-1] - self.display_times[0]
+            if span > 0:
+                lines.append(f"FPS: {(len(self.display_times) - 1) / span:.1f}")
+
+        hit_rate = self.compositor.decode_cache.hit_rate()
+        if hit_rate is not None:
+            lines.append(f"Decode cache hits: {hit_rate:.0%}")
+
+        for pane_num, ms in sorted(self.compositor.pane_times.items()):
+            lines.append(f"P{pane_num}: {ms:.1f} ms")
+
+        stats = profiler.summary()
+        for stage in ("decode", "text_layout", "composite", "photoimage", "tk_blit", "frame"):
+            if stage in stats:
+                count, mean_ms = stats[stage]
+                lines.append(f"{stage}: {mean_ms:.1f} ms avg ({count})")
+
+        self.canvas.delete("hud")
+        text_id = self.canvas.create_text(
+            10, 10, text="\n".join(lines), anchor=tk.NW, fill="yellow", font=("Courier", 9),
+            tags="hud",
+        )
+        x1, y1, x2, y2 = self.canvas.bbox(text_id)
+        background = self.canvas.create_rectangle(
+            x1 - 4, y1 - 4, x2 + 4, y2 + 4, fill="black", outline="yellow", tags="hud"
+        )
+        self.canvas.tag_lower(background, text_id)
 
-    def draw_generic_content(self, draw, file_path, x, y, width, height, font):
-        try:
-            # File statistics
-            stat = os.stat(file_path)
-            size = stat.st_size
-            modified = time.ctime(stat.st_mtime)
-
-            # Draw file icon
-            icon_size = min(32, width // 3, height // 3)
-            icon_x = x + width // 2 - icon_size // 2
-            icon_y = y + 20
-            draw.rectangle(
-                [icon_x, icon_y, icon_x + icon_size, icon_y + icon_size],
-                outline="white",
-                fill="darkgray",
+    def save_trace(self):
+        if not profiler.events:
+            messagebox.showwarning(
+                "Warning", "No timings recorded, tick \"Record performance trace\" first"
             )
+            return
 
-            # File info
-            info_lines = [
-                f"Size: {size:,} bytes",
-                f"Modified: {modified.split()[1]} {modified.split()[2]}",
-                f"Type: {os.path.splitext(file_path)[1] or 'No extension'}",
-            ]
-
-            y_offset = icon_y + icon_size + 20
-            for line in info_lines:
-                if y_offset > y + height - 20:
-                    break
-                draw.text((x + 5, y_offset), line, fill="lightgray", font=font)
-                y_offset += 15
-
-        except Exception as e:
-            draw.text((x + 5, y + 10), f"File error: {str(e)}", fill="red", font=font)
+        output_path = filedialog.asksaveasfilename(
+            defaultextension=".json", filetypes=[("Chrome trace", "*.json")]
+        )
+        if output_path:
+            try:
+                count = profiler.save_trace(output_path)
+                self.update_status(f"Saved {count} trace events to {output_path}")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save trace: {str(e)}")
 
     def toggle_playback(self):
         if self.is_playing:
@@ -632,41 +944,117 @@ class FileVisualizationSoftware:
 
         self.is_playing = True
         self.play_button.config(text="Pause")
-        self.playback_thread = threading.Thread(target=self.playback_loop)
-        self.playback_thread.daemon = True
-        self.playback_thread.start()
+        self.reset_playback_clock()
+        self.playback_after_id = self.root.after(0, self.playback_tick)
 
     def stop_playback(self):
         self.is_playing = False
         self.play_button.config(text="Play")
+        if self.playback_after_id is not None:
+            self.root.after_cancel(self.playback_after_id)
+            self.playback_after_id = None
 
-    def playback_loop(self):
-        while self.is_playing and self.max_frames > 0:
-            try:
-                fps = float(self.fps_var.get())
-                delay = 1.0 / fps
-            except ValueError:
-                delay = 0.5
+    def get_playback_fps(self):
+        try:
+            fps = float(self.fps_var.get())
+        except ValueError:
+            return self.fps
+        return fps if fps > 0 else self.fps
+
+    def reset_playback_clock(self):
+        # Frame n of the playback is due at clock_start + n / playback_fps
+        self.playback_fps = self.get_playback_fps()
+        self.clock_start = time.monotonic()
+        self.clock_ticks = 0
+        self.stats_start = self.clock_start
+        self.stats_frames = 0
+        self.stats_dropped = 0
+
+    def playback_tick(self):
+        """Show the frame that is due now and schedule the next tick on the Tk event loop"""
+        self.playback_after_id = None
+        if not self.is_playing or self.max_frames == 0:
+            self.stop_playback()
+            return
+
+        if self.get_playback_fps() != self.playback_fps:
+            self.reset_playback_clock()
 
-            self.root.after(0, self.next_frame)
-            time.sleep(delay)
+        period = 1.0 / self.playback_fps
+        now = time.monotonic()
+        elapsed_ticks = int((now - self.clock_start) / period)
 
-    def next_frame(self):
+        if self.drop_frames_var.get():
+            # Skip the frames whose deadlines already passed while rendering was behind
+            step = max(1, elapsed_ticks - self.clock_ticks + 1)
+            self.clock_ticks += step
+        else:
+            # Show every frame; when behind, restart the clock instead of bursting to catch up
+            step = 1
+            self.clock_ticks += 1
+            if elapsed_ticks >= self.clock_ticks:
+                self.clock_start = now
+                self.clock_ticks = 1
+
+        self.next_frame(step)
+        self.stats_frames += 1
+        self.stats_dropped += step - 1
+        self.report_playback_rate()
+
+        delay = self.clock_start + self.clock_ticks * period - time.monotonic()
+        self.playback_after_id = self.root.after(max(1, int(delay * 1000)), self.playback_tick)
+
+    def report_playback_rate(self):
+        elapsed = time.monotonic() - self.stats_start
+        if elapsed < 1.0:
+            return
+
+        self.update_status(
+            f"Playing at {self.stats_frames / elapsed:.1f}/{self.playback_fps:g} FPS"
+            f" ({self.stats_dropped} frames dropped)"
+        )
+        self.stats_start += elapsed
+        self.stats_frames = 0
+        self.stats_dropped = 0
+
+    def next_frame(self, step=1):
         if self.max_frames == 0:
             return
 
-        self.current_frame = (self.current_frame + 1) % self.max_frames
+        self.current_frame = (self.current_frame + step) % self.max_frames
         self.frame_var.set(self.current_frame)
         self.update_frame_label()
         self.visualize_current_frame()
 
     def update_frame(self, value=None):
+        # Slider motion only records the wanted frame; redraws are coalesced to the latest one
         self.current_frame = int(float(value or self.frame_var.get()))
         self.update_frame_label()
+
+        if self.scrub_after_id is None:
+            self.scrub_after_id = self.root.after_idle(self.scrub_redraw)
+        if self.settle_after_id is not None:
+            self.root.after_cancel(self.settle_after_id)
+        self.settle_after_id = self.root.after(SCRUB_SETTLE_MS, self.settle_scrub)
+
+    def scrub_redraw(self):
+        """Show a low resolution preview of the frame the slider was last moved to"""
+        self.scrub_after_id = None
+        # Prefetches queued around frames that were scrubbed past are stale now
+        self.compositor.decode_cache.cancel_prefetch()
+        self.visualize_current_frame(preview=True)
+
+    def settle_scrub(self):
+        """Render the full resolution frame once the slider has come to rest"""
+        self.settle_after_id = None
         self.visualize_current_frame()
 
     def update_frame_label(self):
-        self.frame_label.config(text=f"Frame: {self.current_frame+1}/{max(1, self.max_frames)}")
+        text = f"Frame: {self.current_frame+1}/{max(1, self.max_frames)}"
+        key_label = self.timeline.label(self.current_frame)
+        if key_label:
+            text += f" ({key_label})"
+        self.frame_label.config(text=text)
 
     def update_fps(self, event=None):
         try:
@@ -680,6 +1068,8 @@ class FileVisualizationSoftware:
             "base_directory": self.base_directory,
             "layout": self.layout_var.get(),
             "fps": self.fps_var.get(),
+            "align_mode": self.align_mode_var.get(),
+            "align_key": self.align_key_var.get(),
             "panes": {},
         }
 
@@ -687,6 +1077,7 @@ class FileVisualizationSoftware:
             config_data["panes"][i] = {
                 "pattern": config.pattern_var.get(),
                 "enabled": config.enabled_var.get(),
+                "follow": config.follow_var.get(),
             }
 
         filename = filedialog.asksaveasfilename(
@@ -711,8 +1102,7 @@ class FileVisualizationSoftware:
 
                 # Load base settings
                 if "base_directory" in config_data:
-                    self.base_directory = config_data["base_directory"]
-                    self.dir_label.config(text=f"Base: {self.base_directory}")
+                    self.set_base_directory(config_data["base_directory"])
 
                 if "layout" in config_data:
                     self.layout_var.set(config_data["layout"])
@@ -721,6 +1111,9 @@ class FileVisualizationSoftware:
                 if "fps" in config_data:
                     self.fps_var.set(config_data["fps"])
 
+                self.align_mode_var.set(config_data.get("align_mode", "position"))
+                self.align_key_var.set(config_data.get("align_key") or "")
+
                 # Load pane configurations
                 if "panes" in config_data:
                     for pane_id, pane_data in config_data["panes"].items():
@@ -730,6 +1123,8 @@ class FileVisualizationSoftware:
                                 self.pane_configs[pane_idx].pattern_var.set(pane_data["pattern"])
                             if "enabled" in pane_data:
                                 self.pane_configs[pane_idx].enabled_var.set(pane_data["enabled"])
+                            if "follow" in pane_data:
+                                self.pane_configs[pane_idx].follow_var.set(pane_data["follow"])
 
                 self.refresh_all_patterns()
                 self.update_status(f"Configuration loaded from {filename}")
@@ -742,68 +1137,161 @@ class FileVisualizationSoftware:
             messagebox.showwarning("Warning", "No frames to export")
             return
 
-        output_path = filedialog.asksaveasfilename(
-            defaultextension=".mp4", filetypes=[("MP4 files", "*.mp4"), ("AVI files", "*.avi")]
-        )
-
-        if output_path:
-            # Run export in separate thread
-            export_thread = threading.Thread(target=self.export_video_worker, args=(output_path,))
-            export_thread.daemon = True
-            export_thread.start()
-
-    def export_video_worker(self, output_path):
         try:
-            self.update_status("Exporting video...")
-
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
+            width, height = self.get_export_size()
             fps = float(self.fps_var.get())
+            frame_indices = self.get_export_frames(fps)
+        except ValueError as e:
+            messagebox.showerror("Export Error", f"Invalid export settings: {str(e)}")
+            return
+        if not frame_indices:
+            messagebox.showwarning("Warning", "The selected frame range is empty")
+            return
 
-            fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-            out = cv2.VideoWriter(output_path, fourcc, fps, (canvas_width, canvas_height))
-
-            for frame_idx in range(self.max_frames):
-                # Generate frame
-                img = Image.new("RGB", (canvas_width, canvas_height), "black")
-                draw = ImageDraw.Draw(img)
-
-                rows, cols = map(int, self.layout_var.get().split("x"))
-                pane_width = canvas_width // cols
-                pane_height = canvas_height // rows
+        output_path = filedialog.asksaveasfilename(
+            defaultextension=".mp4",
+            filetypes=[
+                ("MP4 files", "*.mp4"),
+                ("AVI files", "*.avi"),
+                ("Animated GIF", "*.gif"),
+                ("Animated WebP", "*.webp"),
+            ],
+        )
 
-                for i in range(rows * cols):
-                    if i not in self.pane_configs:
-                        continue
+        if output_path:
+            try:
+                workers = max(1, int(self.export_workers_var.get()))
+            except ValueError:
+                workers = 1
 
-                    config = self.pane_configs[i]
-                    if not config.enabled_var.get():
-                        continue
+            options = {}
+            if self.encoder_var.get() == "ffmpeg":
+                try:
+                    options["crf"] = int(self.crf_var.get())
+                except ValueError:
+                    self.crf_var.set(str(FFMPEG_CRF))
+            try:
+                self.export_jobs.cpu_budget = max(1, int(self.cpu_budget_var.get()))
+            except ValueError:
+                self.cpu_budget_var.set(str(self.export_jobs.cpu_budget))
 
-                    row = i // cols
-                    col = i % cols
-                    x = col * pane_width
-                    y = row * pane_height
+            # Snapshot widget state on the Tk thread; the job must not touch Tk widgets
+            panes = self.snapshot_panes()
+            try:
+                timeline = self.build_timeline(panes)
+            except ValueError:
+                timeline = Timeline(panes)
+
+            # The GUI compositor's buffers and fonts belong to the Tk thread;
+            # only the decode cache is shared
+            compositor = make_compositor(
+                self.compositor.backend,
+                self.compositor.decode_cache,
+                FontRegistry(self.compositor.fonts.font_path),
+            )
+            # Exporting to the same file with the same settings again resumes a cancelled job
+            self.export_jobs.submit(
+                ExportJob(
+                    compositor, self.layout_var.get(), panes, timeline, frame_indices, width,
+                    height, fps, output_path, workers, self.encoder_var.get(), options,
+                )
+            )
 
-                    if frame_idx < len(config.files):
-                        file_path = config.files[frame_idx]
-                        self.draw_file_pane(draw, file_path, x, y, pane_width, pane_height, i + 1)
-                    else:
-                        self.draw_empty_pane(draw, x, y, pane_width, pane_height, i + 1)
+    def get_export_size(self):
+        """Return the export resolution, the canvas size unless one is entered"""
+        size = self.export_size_var.get().strip().lower()
+        if not size:
+            return self.canvas.winfo_width(), self.canvas.winfo_height()
+
+        width, height = map(int, size.split("x"))
+        if width <= 0 or height <= 0:
+            raise ValueError(f"size {size} must be positive")
+        return width, height
+
+    def get_export_frames(self, fps):
+        """Return the frame indices selected by the export range, stride and duration fields"""
+        def optional(var, convert):
+            value = var.get().strip()
+            return convert(value) if value else None
+
+        # The fields count frames from 1 as the frame label does; End is inclusive
+        start = optional(self.export_start_var, int)
+        end = optional(self.export_end_var, int)
+        return select_frames(
+            self.max_frames,
+            start - 1 if start else 0,
+            end,
+            optional(self.export_stride_var, int) or 1,
+            fps,
+            optional(self.export_duration_var, float),
+        )
 
-                # Convert PIL image to OpenCV format
-                cv_img = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-                out.write(cv_img)
+    def snapshot_panes(self):
+        """Return a copy of the pane configurations that is safe to use off the Tk thread"""
+        panes = {}
+        for i, config in self.pane_configs.items():
+            snapshot = PaneConfig(config.pattern, config.enabled, config.follow)
+            snapshot.files = config.files  # File lists are never modified, only replaced
+            panes[i] = snapshot
+        return panes
+
+    def on_export_job_changed(self, job):
+        values = (os.path.basename(job.output_path), job.state, job.message)
+        if job in self.job_rows:
+            if self.job_list.exists(self.job_rows[job]):
+                self.job_list.item(self.job_rows[job], values=values)
+        else:
+            self.job_rows[job] = self.job_list.insert("", tk.END, values=values)
 
-                self.update_status(f"Exporting frame {frame_idx+1}/{self.max_frames}")
+        if job.state in ("running", "paused"):
+            self.update_status(job.message)
+        elif job.state == "done":
+            self.update_status(f"Video exported to {job.output_path}")
+        elif job.state == "failed":
+            self.update_status("Export failed")
+            messagebox.showerror("Export Error", f"Failed to export video: {job.error}")
 
-            out.release()
-            self.update_status(f"Video exported to {output_path}")
-            messagebox.showinfo("Success", f"Video exported successfully to {output_path}")
+    def selected_jobs(self):
+        """Return the jobs selected in the job list, or all of them if none is"""
+        rows = set(self.job_list.selection())
+        return [job for job, row in self.job_rows.items() if not rows or row in rows]
 
-        except Exception as e:
-            messagebox.showerror("Export Error", f"Failed to export video: {str(e)}")
-            self.update_status("Export failed")
+    def toggle_pause_jobs(self):
+        for job in self.selected_jobs():
+            if job.state == "paused":
+                job.resume()
+            else:
+                job.pause()
+
+    def cancel_jobs(self):
+        for job in self.selected_jobs():
+            job.cancel()
+
+    def clear_finished_jobs(self):
+        self.export_jobs.remove_finished()
+        for job in list(self.job_rows):
+            if job not in self.export_jobs.jobs:
+                self.job_list.delete(self.job_rows.pop(job))
+
+    def on_close(self):
+        # Jobs cancelled by an earlier close are already on their way out
+        if any(not job.cancelled.is_set() for job in self.export_jobs.active_jobs()):
+            if not messagebox.askyesno(
+                "Exports running",
+                "Cancel the running exports and quit? Exporting to the same files again "
+                "resumes videos from their last finished segment.",
+            ):
+                return
+            # Jobs report back through root.after, so they are waited for without blocking Tk
+            self.export_jobs.cancel_all()
+            self.update_status("Waiting for exports to stop...")
+        self.close_when_jobs_stopped()
+
+    def close_when_jobs_stopped(self):
+        if self.export_jobs.active_jobs():
+            self.root.after(JOB_POLL_MS, self.close_when_jobs_stopped)
+        else:
+            self.root.destroy()
 
     def export_frame(self):
         if self.max_frames == 0:
@@ -816,36 +1304,17 @@ class FileVisualizationSoftware:
 
         if output_path:
             try:
-                canvas_width = self.canvas.winfo_width()
-                canvas_height = self.canvas.winfo_height()
-
-                img = Image.new("RGB", (canvas_width, canvas_height), "black")
-                draw = ImageDraw.Draw(img)
-
-                rows, cols = map(int, self.layout_var.get().split("x"))
-                pane_width = canvas_width // cols
-                pane_height = canvas_height // rows
-
-                for i in range(rows * cols):
-                    if i not in self.pane_configs:
-                        continue
-
-                    config = self.pane_configs[i]
-                    if not config.enabled_var.get():
-                        continue
-
-                    row = i // cols
-                    col = i % cols
-                    x = col * pane_width
-                    y = row * pane_height
-
-                    if self.current_frame < len(config.files):
-                        file_path = config.files[self.current_frame]
-                        self.draw_file_pane(draw, file_path, x, y, pane_width, pane_height, i + 1)
-                    else:
-                        self.draw_empty_pane(draw, x, y, pane_width, pane_height, i + 1)
-
-                img.save(output_path)
+                width, height = self.get_export_size()
+                export_frame(
+                    self.compositor,
+                    self.layout_var.get(),
+                    self.pane_configs,
+                    self.current_frame,
+                    width,
+                    height,
+                    output_path,
+                    self.timeline,
+                )
                 self.update_status(f"Frame exported to {output_path}")
                 messagebox.showinfo("Success", f"Frame exported successfully to {output_path}")
 